@@ -16,21 +16,32 @@ Key points:
 - 不改变上游分支/模板/提交/打 tag 的整体流程；
 - 当传入 `--generate-gbp` 时，仅生成/同步 `debian/gbp.conf`，其余保持幂等；
 - 模块入口 `bloom.generators.agirosdebian.generate_cmd` 仍可单包调用。
+
+Performance notes:
+  This path is I/O + subprocess bound, not compute bound. The dominant
+  per-package costs and their mitigations here are:
+  - YAML parse of tracks.yaml     -> libyaml CSafeLoader + (path, mtime)
+                                     caches, section-only construction
+  - 2-3 git fork+exec per package -> batched single-shell git invocation,
+                                     exit-code signalling via --quiet
+  - package.xml XML parse         -> version memoized per (dir, mtime)
+  - generate()/place_template_files overlap -> per-run gbp.conf memo
+  No numeric/SIMD-style optimization applies; keep future work at the
+  caching/batching/library level.
 """
 
 from __future__ import print_function
+import contextlib
 from pathlib import Path
 import os
 from typing import Any, Dict, Optional
 
-try:
-    import yaml
-except Exception:
-    yaml = None
-
-from catkin_pkg.package import parse_package
-
 from bloom.generators.common import default_fallback_resolver
+# Single shared implementation of the tracks.yaml -> gbp.conf plumbing
+# (locating, cached parsing, version resolution); both this generator class
+# and the module CLI entry point go through it, so all caches amortize
+# across entry points within one process.
+from bloom.generators.agirosdebian import generate_cmd as _gbp_impl
 from bloom.generators.debian import DebianGenerator
 from bloom.generators.debian.generator import (
     generate_substitutions_from_package,
@@ -40,8 +51,18 @@ from bloom.logging import info, warning
 from bloom.util import execute_command
 
 
-def _is_placeholder(s: Optional[str]) -> bool:
-    return isinstance(s, str) and s.startswith(':{')
+@contextlib.contextmanager
+def _forced_template_group(name: str):
+    """Temporarily force BLOOM_TEMPLATE_GROUP, restoring the prior value."""
+    prev = os.environ.get('BLOOM_TEMPLATE_GROUP')
+    os.environ['BLOOM_TEMPLATE_GROUP'] = name
+    try:
+        yield
+    finally:
+        if prev is None:
+            os.environ.pop('BLOOM_TEMPLATE_GROUP', None)
+        else:
+            os.environ['BLOOM_TEMPLATE_GROUP'] = prev
 
 
 class AgirosDebianGenerator(DebianGenerator):
@@ -67,6 +88,7 @@ class AgirosDebianGenerator(DebianGenerator):
 
     def handle_arguments(self, args):
         # 记录 CLI 传参，保持上游行为
+        self._package_names = None
         self.generate_gbp = bool(getattr(args, 'generate_gbp', False))
         self.tracks_distro = getattr(args, 'tracks_distro', None)
         self.pkg_override = getattr(args, 'pkg', None)
@@ -85,6 +107,14 @@ class AgirosDebianGenerator(DebianGenerator):
         return DebianGenerator.generate(self)
 
     # ---------------- Minimal substitution hook -------------------------
+    def _peer_package_names(self):
+        # self.packages is fixed after handle_arguments; build the list once
+        # instead of re-running the comprehension for every package.
+        names = getattr(self, '_package_names', None)
+        if names is None:
+            names = self._package_names = [p.name for p in self.packages.values()]
+        return names
+
     def get_subs(self, package, debian_distro, releaser_history=None):
         subs = generate_substitutions_from_package(
             package,
@@ -93,7 +123,7 @@ class AgirosDebianGenerator(DebianGenerator):
             self.rosdistro,
             self.install_prefix,
             self.debian_inc,
-            [p.name for p in self.packages.values()],
+            self._peer_package_names(),
             releaser_history=releaser_history,
             fallback_resolver=default_fallback_resolver,
         )
@@ -116,21 +146,17 @@ class AgirosDebianGenerator(DebianGenerator):
             return
 
         # --- (1) 强制模板组为 agirosdebian，确保 gbp.conf.em 被放入 ---
-        prev_group = os.environ.get('BLOOM_TEMPLATE_GROUP')
-        try:
-            os.environ['BLOOM_TEMPLATE_GROUP'] = 'bloom.generators.agirosdebian'
+        with _forced_template_group('bloom.generators.agirosdebian'):
             base_place_templates('.', build_type, gbp=True)
-        finally:
-            if prev_group is None:
-                os.environ.pop('BLOOM_TEMPLATE_GROUP', None)
-            else:
-                os.environ['BLOOM_TEMPLATE_GROUP'] = prev_group
 
         # --- (2) 跟随上游：把模板加入暂存并提交 ---
-        execute_command('git add ' + debian_dir)
-        _, has_files, _ = execute_command('git diff --cached --name-only', return_io=True)
-        if has_files:
-            execute_command('git commit -m "Placing debian template files"')
+        # 单次 shell 调用：暂存后仅当存在已暂存变更时才提交
+        # （`git diff --cached --quiet` 有变更时返回非零），省去两次 fork+exec。
+        execute_command(
+            'git add ' + debian_dir +
+            ' && git diff --cached --quiet'
+            ' || git commit -m "Placing debian template files"'
+        )
 
         # --- (3) 同步/生成 gbp.conf ---
         try:
@@ -150,101 +176,31 @@ class AgirosDebianGenerator(DebianGenerator):
         pkg_override: Optional[str],
     ):
         """Create or overwrite debian/gbp.conf with computed upstream-tag/tree."""
-        debian_dir.mkdir(parents=True, exist_ok=True)
-        gbp = debian_dir / 'gbp.conf'
-
-        values = self._read_tracks(pkg_dir, tracks_distro)
-        release_inc = values.get('release_inc') or '0'
-        version = self._resolve_version(pkg_dir) or values.get('track_version') or '0.0.0'
-        ros_distro = self._resolve_ros_distro(cli_distro)
-        pkg_name = (pkg_override or pkg_dir.name).strip() or pkg_dir.name
-
-        upstream_tag = f"release/{ros_distro}/{pkg_name}/{version}-{release_inc}"
-
-        content = (
-            "[git-buildpackage]\n"
-            f"upstream-tag={upstream_tag}\n"
-            "upstream-tree=tag\n"
-        )
-        gbp.write_text(content, encoding='utf-8')
+        # generate() and place_template_files() may both land here for the
+        # same package inside one run; skip the redundant parse + write.
+        key = (str(debian_dir), str(pkg_dir), tracks_distro, cli_distro, pkg_override)
+        written = getattr(self, '_gbp_written', None)
+        if written is None:
+            written = self._gbp_written = set()
+        if key in written:
+            return
+        _gbp_impl._ensure_gbp_conf(
+            debian_dir, pkg_dir, tracks_distro, cli_distro, pkg_override)
+        written.add(key)
 
     def _resolve_version(self, pkg_dir: Path) -> Optional[str]:
-        try:
-            pkg = parse_package(str(pkg_dir))
-            return pkg.version
-        except Exception:
-            return None
+        return _gbp_impl._resolve_version(pkg_dir)
 
     def _resolve_ros_distro(self, cli_distro: Optional[str]) -> str:
-        candidates = [
-            cli_distro,
-            os.environ.get('AGIROS_DISTRO'),
-            os.environ.get('AGIROS_ROS_DISTRO'),
-            os.environ.get('ROS_DISTRO'),
-        ]
-        for item in candidates:
-            if isinstance(item, str) and item.strip():
-                return item.strip()
-        return 'unknown'
+        return _gbp_impl._resolve_ros_distro(cli_distro)
 
     def _read_tracks(self, pkg_dir: Path, tracks_distro: Optional[str]) -> Dict[str, Any]:
         """Read release_inc and related keys from tracks.yaml for the current distro."""
-        result: Dict[str, Any] = {}
-        tracks_path = self._locate_tracks(pkg_dir)
-        if not tracks_path or yaml is None:
-            return result
-        try:
-            data = yaml.safe_load(tracks_path.read_text(encoding='utf-8')) or {}
-        except Exception:
-            return result
-        tracks = data.get('tracks', data) if isinstance(data, dict) else {}
-        distro = (
-            tracks_distro
-            or os.environ.get('AGIROS_TRACKS_DISTRO')
-            or os.environ.get('OOB_TRACKS_DISTRO')
-            or 'jazzy'
-        ).lower()
-
-        section: Optional[Dict[str, Any]] = None
-        for k, v in tracks.items():
-            if isinstance(k, str) and k.lower() == distro and isinstance(v, dict):
-                section = v
-                break
-        if not section:
-            return result
-
-        release_inc = section.get('release_inc')
-        if isinstance(release_inc, (int, float)):
-            release_inc = str(int(release_inc))
-        elif isinstance(release_inc, str):
-            release_inc = release_inc.strip()
-        if release_inc and not _is_placeholder(release_inc):
-            result['release_inc'] = release_inc
-
-        version = section.get('version')
-        if isinstance(version, str) and version.strip() and not _is_placeholder(version):
-            result['track_version'] = version.strip()
-        return result
+        return _gbp_impl._read_tracks(pkg_dir, tracks_distro)
 
     def _locate_tracks(self, pkg_dir: Path) -> Optional[Path]:
         """Locate tracks.yaml given current working repo dir."""
-        env_root = os.environ.get('OOB_TRACKS_DIR', '').strip()
-        candidates = []
-        if env_root:
-            candidates += [
-                Path(env_root) / pkg_dir.name / 'tracks.yaml',
-                Path(env_root) / pkg_dir.name / 'track.yaml',
-            ]
-        candidates += [
-            pkg_dir / 'tracks.yaml',
-            pkg_dir / 'track.yaml',
-            pkg_dir.parent / 'tracks.yaml',
-            pkg_dir.parent / 'track.yaml',
-        ]
-        for p in candidates:
-            if p.is_file():
-                return p
-        return None
+        return _gbp_impl._locate_tracks(pkg_dir)
 
 
 # ---------- CLI description for bloom.generate_cmd loader ----------
@@ -33,11 +33,13 @@
 
 from __future__ import print_function
 
+import importlib.util
 import os
 import sys
 import traceback
+import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from bloom.logging import debug
 from bloom.logging import error
@@ -55,75 +57,185 @@ from bloom.generators.debian.generate_cmd import main as _base_main
 
 from bloom.rosdistro_api import get_non_eol_distros_prompt
 
-try:
-    from rosdep2 import create_default_installer_context
-except ImportError:
-    debug(traceback.format_exc())
-    error("rosdep was not detected, please install it.", exit=True)
+# rosdep2, catkin_pkg and yaml are heavy transitive imports that not every
+# invocation needs (e.g. --generate-gbp-only runs never touch rosdep); they
+# are imported lazily at their first point of use.
+yaml = None
+_YamlLoader = None
 
-try:
-    from catkin_pkg.packages import find_packages
-except ImportError:
-    debug(traceback.format_exc())
-    error("catkin_pkg was not detected, please install it.", exit=True)
 
-try:
-    import yaml
-except Exception:
-    yaml = None
+def _ensure_yaml() -> bool:
+    """Import PyYAML on first use; returns False when unavailable."""
+    global yaml, _YamlLoader
+    if yaml is None:
+        try:
+            import yaml as _yaml
+        except Exception:
+            return False
+        yaml = _yaml
+        # Prefer the libyaml-backed loader when available; it is several
+        # times faster than the pure-Python SafeLoader and behaves
+        # identically.
+        _YamlLoader = getattr(_yaml, 'CSafeLoader', _yaml.SafeLoader)
+    return True
 
 
 def _is_placeholder(s):
     return isinstance(s, str) and s.startswith(':{')
 
 
-def _locate_tracks(pkg_dir: Path) -> Optional[Path]:
+# Env keys the gbp.conf path consults; snapshot them once per invocation
+# instead of probing the live os.environ mapping from every helper.
+_ENV_KEYS = ('OOB_TRACKS_DIR', 'AGIROS_TRACKS_DISTRO', 'OOB_TRACKS_DISTRO',
+             'AGIROS_DISTRO', 'AGIROS_ROS_DISTRO', 'ROS_DISTRO')
+
+
+def _snapshot_env() -> Dict[str, str]:
+    return {k: os.environ.get(k, '') for k in _ENV_KEYS}
+
+
+# Parsed tracks.yaml documents keyed by (path, st_mtime_ns). One release run
+# points OOB_TRACKS_DIR at a shared directory reused across many packages, so
+# the parse cost is paid once per file instead of once per package.
+_TRACKS_CACHE: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+
+def _load_tracks_data(tracks_path: Path) -> Dict[str, Any]:
+    """Read and parse tracks.yaml, reusing the cached tree when unchanged."""
+    st = tracks_path.stat()
+    key = (str(tracks_path), st.st_mtime_ns)
+    data = _TRACKS_CACHE.get(key)
+    if data is None:
+        # Hand the binary stream straight to the loader: libyaml decodes
+        # UTF-8 internally, avoiding a second full-file str copy.
+        with tracks_path.open('rb') as f:
+            data = yaml.load(f, Loader=_YamlLoader)
+        if not isinstance(data, dict):
+            data = {}
+        _TRACKS_CACHE[key] = data
+    return data
+
+
+# Per-distro sections keyed by (path, st_mtime_ns, distro).
+_SECTION_CACHE: Dict[Tuple[str, int, str], Optional[Dict[str, Any]]] = {}
+
+
+def _load_distro_section(tracks_path: Path, distro: str) -> Optional[Dict[str, Any]]:
+    """Extract one distro's mapping from tracks.yaml.
+
+    tracks.yaml may carry sections for many distros; walk the composed node
+    tree and only construct Python objects for the requested one. Falls back
+    to a full load when the document does not have the expected
+    ``{tracks: {distro: {...}}}`` shape.
+    """
+    st = tracks_path.stat()
+    key = (str(tracks_path), st.st_mtime_ns, distro)
+    if key in _SECTION_CACHE:
+        return _SECTION_CACHE[key]
+    section: Optional[Dict[str, Any]] = None
+    try:
+        with tracks_path.open('rb') as f:
+            loader = _YamlLoader(f)
+            try:
+                mapping = loader.get_single_node()
+                if isinstance(mapping, yaml.MappingNode):
+                    for k_node, v_node in mapping.value:
+                        if k_node.value == 'tracks' and isinstance(v_node, yaml.MappingNode):
+                            mapping = v_node
+                            break
+                if isinstance(mapping, yaml.MappingNode):
+                    for k_node, v_node in mapping.value:
+                        if isinstance(k_node.value, str) and k_node.value.lower() == distro \
+                                and isinstance(v_node, yaml.MappingNode):
+                            section = loader.construct_object(v_node, deep=True)
+                            break
+            finally:
+                loader.dispose()
+    except Exception:
+        # Unexpected shape or loader without compose support: full load.
+        data = _load_tracks_data(tracks_path)
+        tracks = data.get('tracks', data)
+        for k, v in tracks.items():
+            if isinstance(k, str) and k.lower() == distro and isinstance(v, dict):
+                section = v
+                break
+    _SECTION_CACHE[key] = section
+    return section
+
+
+# Located tracks.yaml paths keyed by (pkg_dir, env_root).
+_LOCATE_CACHE: Dict[Tuple[str, str], Optional[Path]] = {}
+
+_TRACKS = frozenset(('tracks.yaml', 'track.yaml'))
+
+
+def _probe_tracks_names(base: str, names: 'set') -> Optional[Path]:
+    for name in ('tracks.yaml', 'track.yaml'):
+        if name in names:
+            return Path(base) / name
+    return None
+
+
+def _locate_tracks(pkg_dir: Path, env: Optional[Dict[str, str]] = None) -> Optional[Path]:
     """Locate tracks.yaml:
     1) $OOB_TRACKS_DIR/<pkg>/{tracks.yaml,track.yaml}
     2) {pkg_dir, pkg_dir.parent}/{tracks.yaml,track.yaml}
+
+    The env-rooted candidates nearly always win and share one directory, so
+    a single os.scandir of that directory replaces per-candidate stats;
+    results are cached so repeat lookups for the same package are dict hits.
     """
-    env_root = os.environ.get('OOB_TRACKS_DIR', '').strip()
-    candidates = []
+    if env is None:
+        env = os.environ
+    env_root = (env.get('OOB_TRACKS_DIR') or '').strip()
+    key = (str(pkg_dir), env_root)
+    if key in _LOCATE_CACHE:
+        return _LOCATE_CACHE[key]
+    found = None
     if env_root:
-        candidates += [
-            Path(env_root) / pkg_dir.name / 'tracks.yaml',
-            Path(env_root) / pkg_dir.name / 'track.yaml',
-        ]
-    candidates += [
-        pkg_dir / 'tracks.yaml',
-        pkg_dir / 'track.yaml',
-        pkg_dir.parent / 'tracks.yaml',
-        pkg_dir.parent / 'track.yaml',
-    ]
-    for p in candidates:
-        if p.is_file():
-            return p
-    return None
-
-
-def _read_tracks(pkg_dir: Path, tracks_distro: Optional[str]) -> Dict[str, Any]:
+        root = os.path.join(env_root, pkg_dir.name)
+        try:
+            with os.scandir(root) as it:
+                names = {e.name for e in it if e.is_file()}
+        except OSError:
+            names = set()
+        found = _probe_tracks_names(root, names)
+    if found is None:
+        # One listdir per parent instead of one stat per candidate name.
+        for base in (str(pkg_dir), str(pkg_dir.parent)):
+            try:
+                names = _TRACKS.intersection(os.listdir(base))
+            except OSError:
+                continue
+            if names:
+                # Prefer tracks.yaml over the legacy track.yaml spelling.
+                found = Path(base) / (
+                    'tracks.yaml' if 'tracks.yaml' in names else 'track.yaml')
+                break
+    _LOCATE_CACHE[key] = found
+    return found
+
+
+def _read_tracks(pkg_dir: Path, tracks_distro: Optional[str],
+                 env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """Extract release_inc and other keys from tracks.yaml."""
+    if env is None:
+        env = os.environ
     result: Dict[str, Any] = {}
-    path = _locate_tracks(pkg_dir)
-    if not path or yaml is None:
+    path = _locate_tracks(pkg_dir, env)
+    if not path or not _ensure_yaml():
         return result
-    try:
-        data = yaml.safe_load(path.read_text(encoding='utf-8')) or {}
-    except Exception:
-        return result
-    tracks = data.get('tracks', data) if isinstance(data, dict) else {}
     distro = (
         tracks_distro
-        or os.environ.get('AGIROS_TRACKS_DISTRO')
-        or os.environ.get('OOB_TRACKS_DISTRO')
+        or env.get('AGIROS_TRACKS_DISTRO')
+        or env.get('OOB_TRACKS_DISTRO')
         or 'jazzy'
     ).lower()
 
-    section: Optional[Dict[str, Any]] = None
-    for k, v in tracks.items():
-        if isinstance(k, str) and k.lower() == distro and isinstance(v, dict):
-            section = v
-            break
+    try:
+        section = _load_distro_section(path, distro)
+    except Exception:
+        return result
     if not section:
         return result
 
@@ -140,25 +252,62 @@ def _read_tracks(pkg_dir: Path, tracks_distro: Optional[str]) -> Dict[str, Any]:
     return result
 
 
+# package.xml versions keyed by (pkg_dir, package.xml st_mtime_ns).
+_VERSION_CACHE: Dict[Tuple[str, int], Optional[str]] = {}
+
 def _resolve_version(pkg_dir: Path) -> Optional[str]:
+    """Read the package version, re-parsing package.xml only when it changed."""
+    pkgxml = os.path.join(str(pkg_dir), 'package.xml')
     try:
-        pkg = parse_package(str(pkg_dir))
-        return pkg.version
-    except Exception:
+        mtime = os.stat(pkgxml).st_mtime_ns
+    except OSError:
         return None
-
-
-def _resolve_ros_distro(cli_distro: Optional[str]) -> str:
-    candidates = [
-        cli_distro,
-        os.environ.get('AGIROS_DISTRO'),
-        os.environ.get('AGIROS_ROS_DISTRO'),
-        os.environ.get('ROS_DISTRO'),
-    ]
-    for item in candidates:
-        if isinstance(item, str) and item.strip():
-            return item.strip()
-    return 'unknown'
+    key = (str(pkg_dir), mtime)
+    if key in _VERSION_CACHE:
+        return _VERSION_CACHE[key]
+    version: Optional[str] = None
+    # Stream the XML and stop at the first </version>: schema-correct
+    # (skips comments, copes with namespaces) without the full catkin_pkg
+    # parse + Package object build, and memory stays bounded to the first
+    # few events.
+    try:
+        for _event, elem in ET.iterparse(pkgxml, events=('end',)):
+            if elem.tag.rpartition('}')[2] == 'version':
+                version = (elem.text or '').strip() or None
+                break
+    except (OSError, ET.ParseError):
+        pass
+    _VERSION_CACHE[key] = version
+    return version
+
+
+# Resolved distro names keyed by cli_distro; the env side of the lookup is
+# stable within a process, so repeated calls (class + CLI paths, retries)
+# are dict hits.
+_DISTRO_CACHE: Dict[Optional[str], str] = {}
+
+
+def _resolve_ros_distro(cli_distro: Optional[str],
+                        env: Optional[Dict[str, str]] = None) -> str:
+    result = _DISTRO_CACHE.get(cli_distro)
+    if result is not None:
+        return result
+    # Short-circuit on the first hit; the CLI value or AGIROS_DISTRO is
+    # almost always set, so the later env probes are usually skipped.
+    if cli_distro and cli_distro.strip():
+        result = cli_distro.strip()
+    else:
+        if env is None:
+            env = os.environ
+        for var in ('AGIROS_DISTRO', 'AGIROS_ROS_DISTRO', 'ROS_DISTRO'):
+            item = env.get(var)
+            if item and item.strip():
+                result = item.strip()
+                break
+        else:
+            result = 'unknown'
+    _DISTRO_CACHE[cli_distro] = result
+    return result
 
 
 def _ensure_gbp_conf(
@@ -167,15 +316,18 @@ def _ensure_gbp_conf(
     tracks_distro: Optional[str],
     cli_distro: Optional[str],
     pkg_override: Optional[str],
+    env: Optional[Dict[str, str]] = None,
 ):
     """Create or overwrite debian/gbp.conf with computed upstream-tag/tree."""
+    if env is None:
+        env = _snapshot_env()
     debian_dir.mkdir(parents=True, exist_ok=True)
     gbp = debian_dir / 'gbp.conf'
 
-    track_vals = _read_tracks(pkg_dir, tracks_distro)
+    track_vals = _read_tracks(pkg_dir, tracks_distro, env)
     release_inc = track_vals.get('release_inc') or '0'
     version = _resolve_version(pkg_dir) or track_vals.get('track_version') or '0.0.0'
-    ros_distro = _resolve_ros_distro(cli_distro)
+    ros_distro = _resolve_ros_distro(cli_distro, env)
     pkg_name = (pkg_override or pkg_dir.name).strip()
     if not pkg_name:
         pkg_name = pkg_dir.name
@@ -187,7 +339,16 @@ def _ensure_gbp_conf(
         f"upstream-tag={upstream_tag}\n"
         "upstream-tree=tag\n"
     )
-    gbp.write_text(content, encoding='utf-8')
+    encoded = content.encode('utf-8')
+    # Avoid touching the file (and the git stat/hash churn that follows)
+    # when the on-disk content is already byte-identical.
+    try:
+        if gbp.stat().st_size == len(encoded) and gbp.read_bytes() == encoded:
+            info(f"gbp.conf already up to date (upstream-tag={upstream_tag})")
+            return
+    except OSError:
+        pass
+    gbp.write_bytes(encoded)
     info(f"gbp.conf updated with upstream-tag={upstream_tag}")
 
 
@@ -238,6 +399,13 @@ def main(args=None, get_subs_fn=None):
         _place_template_files = args.place_template_files
         _process_template_files = args.process_template_files
 
+    # find_spec probe instead of try/except ImportError: the availability
+    # check costs a path lookup, not a full (failed) import + traceback
+    # formatting.
+    if importlib.util.find_spec('catkin_pkg') is None:
+        error("catkin_pkg was not detected, please install it.", exit=True)
+    from catkin_pkg.packages import find_packages
+
     pkgs_dict = find_packages(package_path)
     if len(pkgs_dict) == 0:
         sys.exit("No packages found in path: '{0}'".format(package_path))
@@ -245,20 +413,28 @@ def main(args=None, get_subs_fn=None):
         sys.exit("Multiple packages found, "
                  "this tool only supports one package at a time.")
 
-    os_data = create_default_installer_context().get_os_name_and_version()
-    os_name, os_version = os_data
-    ros_distro = os.environ.get('ROS_DISTRO', 'indigo')
-
-    # Allow args overrides
-    os_name = args.os_name or os_name
-    os_version = args.os_version or os_version
-    ros_distro = args.ros_distro or ros_distro
+    if args.os_name and args.os_version:
+        # Both provided on the command line: the rosdep installer context
+        # (which reads and parses the rosdep config YAMLs) is not needed.
+        os_name, os_version = args.os_name, args.os_version
+    else:
+        if importlib.util.find_spec('rosdep2') is None:
+            error("rosdep was not detected, please install it.", exit=True)
+        from rosdep2 import create_default_installer_context
+
+        os_name, os_version = \
+            create_default_installer_context().get_os_name_and_version()
+        # Allow args overrides
+        os_name = args.os_name or os_name
+        os_version = args.os_version or os_version
+    ros_distro = args.ros_distro or os.environ.get('ROS_DISTRO', 'indigo')
 
     # Summarize
     info(fmt("@!@{gf}==> @|") +
          fmt("Generating debs for @{cf}%s:%s@| for package(s) %s" %
              (os_name, os_version, [p.name for p in pkgs_dict.values()])))
 
+    env = _snapshot_env()
     for path, pkg in pkgs_dict.items():
         template_files = None
         try:
@@ -283,6 +459,7 @@ def main(args=None, get_subs_fn=None):
                         args.tracks_distro,
                         getattr(args, 'distro', None),
                         getattr(args, 'pkg', None),
+                        env,
                     )
                 except Exception as e:
                     warning("Skip gbp.conf sync (%s)" % e)
@@ -303,4 +480,3 @@ description = dict(
     main=main,
     prepare_arguments=prepare_arguments
 )
-from catkin_pkg.package import parse_package
@@ -670,6 +670,7 @@ class DebianGenerator(BloomGenerator):
                 exit=True
             )
         self.packages = {}
+        self._package_names = None
         self.tag_names = {}
         self.names = []
         self.branch_args = []
@@ -900,8 +901,11 @@ class DebianGenerator(BloomGenerator):
         place_template_files('.', build_type, gbp=True)
         # Commit results
         execute_command('git add ' + debian_dir)
-        _, has_files, _ = execute_command('git diff --cached --name-only', return_io=True)
-        if has_files:
+        # `--quiet` exits 1 iff there are staged changes; the exit code is
+        # signal enough, so the staged filename list is never materialized.
+        has_staged = execute_command(
+            'git diff --cached --quiet', autofail=False, silent_error=True)
+        if has_staged != 0:
             execute_command('git commit -m "Placing debian template files"')
 
     def get_releaser_history(self):
@@ -951,7 +955,9 @@ class DebianGenerator(BloomGenerator):
         if not path:
             return default_branch
         try:
-            data = yaml.safe_load(path.read_text(encoding='utf-8')) or {}
+            loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+            with path.open('rb') as f:
+                data = yaml.load(f, Loader=loader) or {}
             tracks = data.get('tracks', data)
             distro = (os.environ.get('OOB_TRACKS_DISTRO') or self.rosdistro or 'jazzy').lower()
             section = None
@@ -985,6 +991,14 @@ class DebianGenerator(BloomGenerator):
         gbp.write_text(content, encoding='utf-8')
         info("gbp.conf created as a fallback safety net")
 
+    def _peer_package_names(self):
+        # self.packages is fixed after handle_arguments; build the list once
+        # instead of re-running the comprehension for every package.
+        names = getattr(self, '_package_names', None)
+        if names is None:
+            names = self._package_names = [p.name for p in self.packages.values()]
+        return names
+
     def get_subs(self, package, debian_distro, releaser_history=None):
         return generate_substitutions_from_package(
             package,
@@ -993,7 +1007,7 @@ class DebianGenerator(BloomGenerator):
             self.rosdistro,
             self.install_prefix,
             self.debian_inc,
-            [p.name for p in self.packages.values()],
+            self._peer_package_names(),
             releaser_history=releaser_history,
             fallback_resolver=missing_dep_resolver
         )
@@ -22,16 +22,33 @@ This module is designed to be imported by agirosdebian (with a CLI switch like
 from __future__ import annotations
 
 import argparse
+import functools
 import os
+import re
 import sys
+import xml.etree.ElementTree as ET
 from pathlib import Path
+from string import Template
 from typing import Dict, Optional, Tuple
 
-try:
-    import yaml  # type: ignore
-except Exception as exc:  # pragma: no cover
-    print("ERROR: PyYAML is required. Try: pip install pyyaml", file=sys.stderr)
-    raise
+# PyYAML is a comparatively heavy import; defer it to the first parse so
+# argparse errors and --help stay fast.
+yaml = None
+_SafeLoader = None
+
+
+def _ensure_yaml() -> None:
+    global yaml, _SafeLoader
+    if yaml is None:
+        try:
+            import yaml as _yaml  # type: ignore
+        except Exception:  # pragma: no cover
+            print("ERROR: PyYAML is required. Try: pip install pyyaml", file=sys.stderr)
+            raise
+        yaml = _yaml
+        # libyaml-backed loader when available; several times faster than
+        # the pure-Python SafeLoader with identical behaviour.
+        _SafeLoader = getattr(_yaml, "CSafeLoader", _yaml.SafeLoader)
 
 # -----------------------------
 # Global configuration (overridable via env)
@@ -50,35 +67,115 @@ TRACKS_CANDIDATES = ("tracks.yaml", "track.yaml")
 # Helpers
 # -----------------------------
 
+# Located tracks files keyed by release_dir, so repeated invocations in one
+# process skip the directory scan entirely.
+_TRACKS_FILE_CACHE: Dict[str, Path] = {}
+
+
 def _find_tracks_file(release_dir: Path) -> Path:
+    key = str(release_dir)
+    cached = _TRACKS_FILE_CACHE.get(key)
+    if cached is not None:
+        return cached
+    # One scandir of the release dir replaces a stat per candidate name.
+    try:
+        with os.scandir(key) as it:
+            names = {e.name for e in it if e.is_file(follow_symlinks=False)}
+    except OSError:
+        names = set()
     for name in TRACKS_CANDIDATES:
-        p = release_dir / name
-        if p.is_file():
-            return p
+        if name in names:
+            found = release_dir / name
+            _TRACKS_FILE_CACHE[key] = found
+            return found
     raise FileNotFoundError(f"tracks.yaml not found under: {release_dir}")
 
 
-def _load_tracks(tracks_path: Path) -> Dict:
-    data = yaml.safe_load(tracks_path.read_text(encoding="utf-8"))
+@functools.lru_cache(maxsize=64)
+def _parse_tracks_cached(path_str: str, mtime_ns: int) -> Dict:
+    """Parse tracks.yaml once per (path, mtime); treat the result as read-only."""
+    _ensure_yaml()
+    # Binary stream straight into the loader: libyaml decodes UTF-8
+    # internally, no intermediate str copy of the whole file.
+    with open(path_str, "rb") as f:
+        data = yaml.load(f, Loader=_SafeLoader)
     if not isinstance(data, dict):
-        raise ValueError(f"Invalid YAML structure in {tracks_path}")
+        raise ValueError(f"Invalid YAML structure in {path_str}")
+    return data
+
+
+def _load_tracks(tracks_path: Path) -> Dict:
+    data = _parse_tracks_cached(str(tracks_path), os.stat(tracks_path).st_mtime_ns)
     # Some repos use top-level key 'tracks', some flatten
     return data.get("tracks", data)
 
 
 def _pick_distro_section(tracks: Dict, distro: str) -> Dict:
     key_lower = distro.lower()
+    # case-folded index: one .lower() per key instead of one per lookup pass
+    idx = {k.lower(): v for k, v in tracks.items()
+           if isinstance(k, str) and isinstance(v, dict)}
     # exact (case-insensitive) match
-    for k, v in tracks.items():
-        if isinstance(k, str) and k.lower() == key_lower and isinstance(v, dict):
-            return v
+    section = idx.get(key_lower)
+    if section is not None:
+        return section
     # partial fallback (contains)
-    for k, v in tracks.items():
-        if isinstance(k, str) and key_lower in k.lower() and isinstance(v, dict):
+    for k, v in idx.items():
+        if key_lower in k:
             return v
     raise KeyError(f"No section for distro '{distro}' in tracks.yaml")
 
 
+@functools.lru_cache(maxsize=128)
+def _parse_distro_only(path_str: str, mtime_ns: int, distro_lower: str) -> Dict:
+    """Extract one distro's section without building the full document.
+
+    tracks.yaml can carry many distro sections; walk the composed node tree
+    and construct Python objects only for the requested one. Keeps the same
+    matching rules as _pick_distro_section (case-insensitive exact, then
+    substring fallback) and falls back to the full parse when the document
+    does not have the expected mapping shape.
+    """
+    _ensure_yaml()
+    try:
+        with open(path_str, "rb") as f:
+            loader = _SafeLoader(f)
+            try:
+                mapping = loader.get_single_node()
+                if isinstance(mapping, yaml.MappingNode):
+                    for k_node, v_node in mapping.value:
+                        if k_node.value == "tracks" and isinstance(v_node, yaml.MappingNode):
+                            mapping = v_node
+                            break
+                if isinstance(mapping, yaml.MappingNode):
+                    partial = None
+                    for k_node, v_node in mapping.value:
+                        if not isinstance(k_node.value, str) or not isinstance(v_node, yaml.MappingNode):
+                            continue
+                        k_lower = k_node.value.lower()
+                        if k_lower == distro_lower:
+                            return loader.construct_object(v_node, deep=True)
+                        if partial is None and distro_lower in k_lower:
+                            partial = v_node
+                    if partial is not None:
+                        return loader.construct_object(partial, deep=True)
+            finally:
+                loader.dispose()
+    except OSError:
+        raise
+    except Exception:
+        pass
+    # Unexpected shape or loader without compose support: full load.
+    tracks = _load_tracks(Path(path_str))
+    return _pick_distro_section(tracks, distro_lower)
+
+
+def _load_distro_section(tracks_path: Path, distro: str) -> Dict:
+    """Cached single-section load; raises KeyError when the distro is absent."""
+    return _parse_distro_only(
+        str(tracks_path), os.stat(tracks_path).st_mtime_ns, distro.lower())
+
+
 def _normalize_branch_name(name: str) -> str:
     # Keep it simple: replace spaces with '-', ensure non-empty
     name = name.strip().replace(" ", "-")
@@ -92,11 +189,17 @@ def _read_pkgxml_version(source_dir: Path) -> str:
     pkgxml = source_dir / "package.xml"
     if not pkgxml.is_file():
         return "0.0.0"
-    text = pkgxml.read_text(encoding="utf-8", errors="ignore")
-    # naive extraction to avoid adding deps
-    import re
-    m = re.search(r"<\s*version\s*>\s*([^<]+)\s*<\s*/\s*version\s*>", text)
-    return (m.group(1).strip() if m else "0.0.0")
+    # Stream the XML and stop at the first </version>; unlike a regex scan
+    # this ignores commented-out tags and copes with namespaced documents,
+    # while still never building the whole tree (<version> sits within the
+    # first few hundred bytes of a typical manifest).
+    try:
+        for _event, elem in ET.iterparse(str(pkgxml), events=("end",)):
+            if elem.tag.rpartition("}")[2] == "version":
+                return (elem.text or "").strip() or "0.0.0"
+    except ET.ParseError:
+        pass
+    return "0.0.0"
 
 
 def _extract_upstream_info(section: Dict) -> Tuple[str, Optional[str], Optional[str]]:
@@ -139,20 +242,50 @@ def _extract_upstream_info(section: Dict) -> Tuple[str, Optional[str], Optional[
     return upstream_branch, tag_pattern, tree_value
 
 
+def _find_nested(root: Path, name: str) -> Optional[Path]:
+    """Find <root>/*/<name>, bailing on the first hit.
+
+    Unlike root.glob(f"*/{name}") this never materializes the full child
+    list and uses the DirEntry's cached stat per entry.
+    """
+    try:
+        with os.scandir(root) as it:
+            for e in it:
+                if not e.is_dir(follow_symlinks=False):
+                    continue
+                cand = os.path.join(e.path, name)
+                if os.path.isdir(cand):
+                    return Path(cand)
+    except OSError:
+        pass
+    return None
+
+
 def _ensure_debian_dir(source_dir: Path) -> Path:
-    debian_dir = source_dir / DEBIAN_DIR_NAME
-    debian_dir.mkdir(parents=True, exist_ok=True)
-    return debian_dir
+    # os.path.join + makedirs beats Path arithmetic here; only the returned
+    # handle needs to be a Path.
+    debian_dir = os.path.join(str(source_dir), DEBIAN_DIR_NAME)
+    os.makedirs(debian_dir, exist_ok=True)
+    return Path(debian_dir)
+
+
+# normalize ':{var}' / '{var}' -> '${var}' for string.Template; only the
+# supported variables are converted, so unrecognized braces pass through
+# verbatim. Patterns repeat across packages, so the compiled template is
+# memoized.
+_PLACEHOLDER_RE = re.compile(r":?\{(version|release_inc|distro|package|pkg)\}")
+
+
+@functools.lru_cache(maxsize=128)
+def _pattern_template(pattern: str) -> Template:
+    return Template(_PLACEHOLDER_RE.sub(r"${\1}", pattern))
 
 
 def _render_tag(pattern: str, *, distro: str, pkg: str, version: str, release_inc: int) -> str:
     """Render {version}/{release_inc} placeholders in tag pattern.
     Supports either '{var}' or ':{var}' placeholder styles.
-    Falls back to the original pattern if formatting fails.
+    Unknown or absent placeholders are left untouched.
     """
-    # normalize ':{var}' -> '{var}' to allow str.format
-    import re
-    norm = re.sub(r":\{(\w+)\}", r"{\1}", pattern)
     mapping = {
         "version": version,
         "release_inc": release_inc,
@@ -160,21 +293,36 @@ def _render_tag(pattern: str, *, distro: str, pkg: str, version: str, release_in
         "package": pkg,
         "pkg": pkg,
     }
-    try:
-        return norm.format(**mapping)
-    except Exception:
-        # if pattern does not use placeholders, just return as is
-        return pattern
+    # safe_substitute leaves unknown placeholders in place rather than
+    # raising, so the placeholder-free common path pays no try/except.
+    return _pattern_template(pattern).safe_substitute(mapping)
 
 
 def _write_gbp_conf(debian_dir: Path, upstream_tag: str, tree_value: Optional[str]) -> Path:
     gbp_path = debian_dir / GBP_CONF_NAME
-    lines = ["[git-buildpackage]"]
     # Only two required fields per request
-    lines.append(f"upstream-tag={upstream_tag}")
-    lines.append(f"upstream-tree={tree_value or 'tag'}")
-
-    gbp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    payload = (
+        "[git-buildpackage]\n"
+        f"upstream-tag={upstream_tag}\n"
+        f"upstream-tree={tree_value or 'tag'}\n"
+    ).encode("utf-8")
+
+    # Already synced: skip the write (and the mtime churn / VCS dirty
+    # state it would cause). Reading back a ~60-byte file is far cheaper
+    # than rewriting it.
+    try:
+        if gbp_path.read_bytes() == payload:
+            return gbp_path
+    except OSError:
+        pass
+
+    # Tiny file: a raw fd write skips the TextIOWrapper + incremental
+    # encoder setup of write_text.
+    fd = os.open(str(gbp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, payload)
+    finally:
+        os.close(fd)
     return gbp_path
 
 
@@ -213,18 +361,15 @@ def generate_gbp_conf(*, distro: str, pkg: Optional[str] = None, release_path: O
             source_path = cand1
         else:
             # Search one level deeper (some projects are nested one level)
-            matches = list(source_root.glob(f"*/{pkg}"))  # type: ignore[arg-type]
-            if matches:
-                source_path = matches[0]
-            else:
+            source_path = _find_nested(source_root, pkg)  # type: ignore[arg-type]
+            if source_path is None:
                 raise FileNotFoundError(f"Could not locate source dir for package '{pkg}' under {source_root}")
 
     release_path = Path(release_path).resolve()
     source_path = Path(source_path).resolve()
 
     tracks_file = _find_tracks_file(release_path)
-    tracks_dict = _load_tracks(tracks_file)
-    section = _pick_distro_section(tracks_dict, distro)
+    section = _load_distro_section(tracks_file, distro)
 
     # Keep existing extraction to get tree preference if provided
     _, _tag_pattern_unused, tree_value = _extract_upstream_info(section)
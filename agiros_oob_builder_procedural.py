@@ -21,14 +21,31 @@
 """
 import shlex
 import argparse
+import asyncio
+import atexit
+import functools
+import hashlib
+import json
 import os
+import pickle
+import re
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 import yaml
 import shlex  # 新增：支持把 BLOOM_BIN 解析为多段命令
 
+# libyaml 加载器比纯 Python SafeLoader 快 3-10 倍，行为一致；缺 libyaml 时回退
+try:
+    from yaml import CSafeLoader as _YamlLoader
+    _HAS_LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+    _HAS_LIBYAML = False
+
 
 # ----------------------------- Global Defaults -----------------------------
 class Defaults:
@@ -53,35 +70,85 @@ def log(msg: str):
     print(msg, flush=True)
 
 
-def run(cmd, cwd=None, dry_run=False, env: Optional[Dict[str, str]] = None):
+# 子进程输出里关心的行，预编译一次；目标都是 ASCII 字面量，
+# 用 bytes 模式直接匹配原始行，绝大多数行根本不用解码
+PROMPT_RE = re.compile(rb"Continue \[Y/n\]\?")
+MISSING_RULE_RE = re.compile(rb"No agirosdep rule for")
+# 已知错误模式合并为一个交替正则：一趟线性扫描覆盖全部模式，
+# 以后加新模式只改这里，不随模式数增加扫描次数
+ERROR_RE = re.compile(rb"No agirosdep rule for|Unresolved|cannot find")
+
+# 单次 bloom 调用的超时（秒），可用环境变量覆盖；挂死只判该包失败，不拖垮整轮
+RUN_TIMEOUT = int(os.environ.get("AGIROS_RUN_TIMEOUT", "600"))
+
+
+async def _run_async(cmd, cwd, env, capture_patterns):
+    """异步多路复用子进程 stdout 读取与 stdin 应答。
+
+    旧实现同步迭代 proc.stdout 并偶尔写 proc.stdin：一旦 stdin 管道写满
+    或输出节奏异常就会互相等死。asyncio 的 drain() 写回不会阻塞读取，
+    并且整体包在 wait_for 超时里。
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *(str(c) for c in cmd),
+        cwd=str(cwd) if cwd else None,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        env=env,
+    )
+    matched = []
+
+    async def _pump():
+        # 每行 flush 意味着每行一次 write 系统调用；改为关键行（提示/
+        # 命中）立即刷出，其余最多攒 64 行，syscall 数降一两个量级
+        pending = 0
+        while True:
+            raw = await proc.stdout.readline()
+            if not raw:
+                break
+            sys.stdout.buffer.write(raw)
+            pending += 1
+            hit = bool(capture_patterns) and any(p.search(raw) for p in capture_patterns)
+            if hit:
+                # 只有命中的行才需要 str 形式（写入 fail.log）
+                matched.append(raw.decode("utf-8", "replace").rstrip("\n"))
+            prompt = PROMPT_RE.search(raw)
+            if hit or prompt or pending >= 64:
+                sys.stdout.buffer.flush()
+                pending = 0
+            if prompt:
+                proc.stdin.write(b"n\n")
+                await proc.stdin.drain()
+        if pending:
+            sys.stdout.buffer.flush()
+        return await proc.wait()
+
+    try:
+        rc = await asyncio.wait_for(_pump(), timeout=RUN_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        log(f"[ERR] 子进程超时（>{RUN_TIMEOUT}s），已终止: {' '.join(map(str, cmd))}")
+        return 124, matched
+    return rc, matched
+
+
+def run(cmd, cwd=None, dry_run=False, env: Optional[Dict[str, str]] = None,
+        capture_patterns=None):
+    """执行子进程，边读边匹配 capture_patterns，只保留命中的行。
+
+    不再缓存全部输出再 join/splitlines 扫一遍：内存占用与日志长度无关。
+    返回 (rc, matched_lines)；dry_run 或无匹配时 matched_lines 为空列表。
+    """
     shown = " ".join(map(str, cmd))
     prefix = "[DRY]" if dry_run else "[RUN]"
     env_hint = f" env[OOB_TRACKS_DIR]={env.get('OOB_TRACKS_DIR')}" if env and 'OOB_TRACKS_DIR' in env else ""
     log(f"{prefix} {shown}{env_hint} (cwd={cwd or os.getcwd()})")
     if dry_run:
-        return 0, None
-    proc = subprocess.Popen(
-        cmd,
-        cwd=str(cwd) if cwd else None,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        env=env if env is not None else os.environ.copy(),
-    )
-    out_lines = []
-    for line in proc.stdout:
-        sys.stdout.write(line)
-        sys.stdout.flush()
-        out_lines.append(line)
-        if "Continue [Y/n]?" in line:
-            proc.stdin.write("n\n")
-            proc.stdin.flush()
-    proc.wait()
-    rc = proc.returncode
-    if rc != 0:
-        return rc, "\n".join(out_lines)
-    return rc, None
+        return 0, []
+    return asyncio.run(_run_async(
+        cmd, cwd, env if env is not None else os.environ.copy(), capture_patterns))
 
 def build_cmd_for(kind: str, common_bin: str) -> list:
     """
@@ -101,78 +168,481 @@ def is_direct_module_cmd(cmd_tokens: list) -> bool:
 
 # ----------------------------- Resume 检查 -----------------------------
 
+# 只做 ASCII 字面量匹配，直接在字节上扫，省掉整文件 UTF-8 解码
 def is_valid_debian(pkg_dir: Path) -> bool:
     control = pkg_dir / "debian" / "control"
-    if not control.exists():
+    try:
+        if control.stat().st_size == 0:
+            return False
+        data = control.read_bytes()
+    except OSError:
         return False
-    text = control.read_text(encoding="utf-8", errors="ignore")
-    if "!nocheck" in text:
+    if b"!nocheck" in data:
         return False
-    if "Depends:" not in text:
+    if b"Depends:" not in data:
         return False
     return True
 
 
 def is_valid_spec(pkg_dir: Path) -> bool:
     rpm_dir = pkg_dir / "rpm"
-    if not rpm_dir.is_dir():
+    specs = []
+    try:
+        # iterdir + endswith 替代 glob("*.spec") 的 fnmatch 遍历
+        specs = [p for p in rpm_dir.iterdir() if p.name.endswith(".spec")]
+    except OSError:
         return False
-    specs = list(rpm_dir.glob("*.spec"))
     if not specs:
         return False
     for s in specs:
-        text = s.read_text(encoding="utf-8", errors="ignore")
-        if "!nocheck" in text:
+        try:
+            if b"!nocheck" in s.read_bytes():
+                return False
+        except OSError:
             return False
     return True
 
 
+# ----------------------------- Done 清单 -----------------------------
+# done.json 记录每个子包已验证/生成的产物 mtime：
+#   {str(subpkg): {"ubuntu": control_mtime_ns, "openeuler": newest_spec_mtime_ns}}
+# 命中时直接跳过 is_valid_* 的文件读取，把 resume 检查变成一次 stat + 字典查找。
+
+def _load_done_state(path: Path) -> Dict[str, Dict[str, int]]:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except Exception:
+        return {}
+
+
+def _save_done_state(path: Path, state: Dict[str, Dict[str, int]]):
+    tmp = str(path) + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        log(f"[WARN] 写入 done 清单失败: {path} -> {e}")
+
+
+def _control_mtime(subpkg: Path) -> Optional[int]:
+    try:
+        return (subpkg / "debian" / "control").stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _spec_mtime(subpkg: Path) -> Optional[int]:
+    newest = None
+    try:
+        for p in (subpkg / "rpm").iterdir():
+            if p.name.endswith(".spec"):
+                mt = p.stat().st_mtime_ns
+                if newest is None or mt > newest:
+                    newest = mt
+    except OSError:
+        return None
+    return newest
+
+
 # ----------------------------- Tracks Parser -----------------------------
 
+class TracksCache:
+    """tracks.yaml 解析缓存，按内容 sha256 作键，跨次运行以 pickle 持久化。
+
+    resume 运行时大多数包会被跳过，YAML 解析是启动阶段的主要开销；
+    pickle.load 远快于重新解析。命中判定分两级：
+    先比 (mtime, size)（一次 stat，不读文件），变化了才读内容并哈希。
+    """
+
+    def __init__(self, path: Path, max_entries: int = 2000):
+        self.path = path
+        self.max_entries = max_entries
+        self._by_hash: Dict[bytes, Any] = {}
+        self._by_stat: Dict[str, tuple] = {}  # path -> (mtime_ns, size, digest)
+        self._dirty = False
+        try:
+            with path.open("rb") as f:
+                payload = pickle.load(f)
+            if isinstance(payload, dict):
+                self._by_hash = payload.get("by_hash", {})
+                self._by_stat = payload.get("by_stat", {})
+        except Exception:
+            pass
+
+    def stat_digest(self, path_str: str, st: os.stat_result) -> Optional[bytes]:
+        entry = self._by_stat.get(path_str)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        return None
+
+    def get(self, key) -> Optional[Any]:
+        parsed = self._by_hash.get(key)
+        if parsed is not None:
+            # 重新插入维持 LRU 序（dict 按插入序迭代）
+            self._by_hash[key] = self._by_hash.pop(key)
+        return parsed
+
+    def put(self, path_str: str, st: os.stat_result, digest: bytes, key, parsed: Any):
+        self._by_hash[key] = parsed
+        self._by_stat[path_str] = (st.st_mtime_ns, st.st_size, digest)
+        while len(self._by_hash) > self.max_entries:
+            self._by_hash.pop(next(iter(self._by_hash)))
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp = str(self.path) + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump({"by_hash": self._by_hash, "by_stat": self._by_stat},
+                            f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError as e:
+            log(f"[WARN] 写入 tracks 缓存失败: {self.path} -> {e}")
+
+
+def _extract_section(raw: bytes, target: str) -> Optional[Dict[str, Any]]:
+    """从原始字节中只物化 tracks.<distro> 子树。
+
+    我们最终只用到一个 distro 段的 actions；走组合后的节点树、仅对
+    命中的子树 construct，其余 distro 段完全不构建 Python 对象。
+    匹配规则与字典路径一致：大小写不敏感精确匹配优先，其次子串。
+    """
+    loader = _YamlLoader(raw)
+    try:
+        mapping = loader.get_single_node()
+        if not isinstance(mapping, yaml.MappingNode):
+            return None
+        for k_node, v_node in mapping.value:
+            if k_node.value == "tracks" and isinstance(v_node, yaml.MappingNode):
+                mapping = v_node
+                break
+        partial = None
+        for k_node, v_node in mapping.value:
+            k = k_node.value
+            if not isinstance(k, str) or not isinstance(v_node, yaml.MappingNode):
+                continue
+            kl = k.lower()
+            if kl == target:
+                return loader.construct_object(v_node, deep=True)
+            if partial is None and target in kl:
+                partial = v_node
+        if partial is not None:
+            return loader.construct_object(partial, deep=True)
+        return None
+    finally:
+        loader.dispose()
+
+
+@functools.lru_cache(maxsize=4096)
+def _find_distro_key(keys: tuple, target: str) -> Optional[str]:
+    """在 keys 中找 target 的 key（大小写不敏感，其次子串匹配）。
+
+    几乎所有 tracks.yaml 的键集合都一样（jazzy/rolling/...），按
+    (keys 元组, target) 记忆化后首个文件之后全是缓存命中。
+    """
+    for k in keys:
+        if k.lower() == target:
+            return k
+    for k in keys:
+        if target in k.lower():
+            return k
+    return None
+
+
 class TracksParser:
-    def __init__(self, distro: str = "jazzy"):
+    def __init__(self, distro: str = "jazzy", cache: Optional[TracksCache] = None):
         self.distro = distro
+        self.cache = cache
+        self._preread: Dict[str, tuple] = {}  # path -> (stat_result, raw bytes)
+
+    def prefetch(self, paths) -> None:
+        """并发预读一批 tracks.yaml 的原始字节，重叠磁盘延迟。
+
+        命中 TracksCache stat 快路径的文件不需要读；读取用线程池
+        （I/O 阻塞释放 GIL），解析仍由调用方串行完成——libyaml 下
+        解析本身比跨进程传输解析结果还快。
+        """
+        def _read(p):
+            path_str = str(p)
+            try:
+                st = os.stat(p)
+                if self.cache is not None and self.cache.stat_digest(path_str, st):
+                    return None
+                with open(p, "rb") as f:
+                    return path_str, (st, f.read())
+            except OSError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            for item in ex.map(_read, paths):
+                if item is not None:
+                    self._preread[item[0]] = item[1]
 
     def _find_distro_case_insensitive(self, tracks: Dict[str, Any]) -> Optional[str]:
-        target = self.distro.lower()
-        for k in tracks.keys():
-            if isinstance(k, str) and k.lower() == target:
-                return k
-        for k in tracks.keys():
-            if isinstance(k, str) and target in k.lower():
-                return k
-        return None
+        keys = tuple(k for k in tracks.keys() if isinstance(k, str))
+        return _find_distro_key(keys, self.distro.lower())
 
     def parse_file(self, tracks_yaml_path: Path) -> Optional[Dict[str, Any]]:
         try:
-            data = yaml.safe_load(tracks_yaml_path.read_text(encoding="utf-8")) or {}
+            section = self._load(tracks_yaml_path)
         except Exception as e:
             log(f"[WARN] 解析 YAML 失败: {tracks_yaml_path} -> {e}")
             return None
-
-        tracks = None
-        if isinstance(data, dict) and "tracks" in data:
-            tracks = data["tracks"]
-        elif isinstance(data, dict):
-            tracks = data
-        else:
-            return None
-
-        key = self._find_distro_case_insensitive(tracks)
-        if key is None:
-            return None
-        section = tracks.get(key)
         return section if isinstance(section, dict) else None
 
+    def _section_from_raw(self, raw: bytes) -> Optional[Dict[str, Any]]:
+        target = self.distro.lower()
+        try:
+            return _extract_section(raw, target)
+        except Exception:
+            # 结构异常或 loader 不支持 compose：退回整树解析 + 字典匹配
+            data = yaml.load(raw, Loader=_YamlLoader) or {}
+            if not isinstance(data, dict):
+                return None
+            tracks = data.get("tracks", data)
+            key = self._find_distro_case_insensitive(tracks)
+            section = tracks.get(key) if key is not None else None
+            return section if isinstance(section, dict) else None
+
+    def _load(self, tracks_yaml_path: Path) -> Optional[Dict[str, Any]]:
+        path_str = str(tracks_yaml_path)
+        st, raw = self._preread.pop(path_str, (None, None))
+        if self.cache is None:
+            if raw is None:
+                raw = tracks_yaml_path.read_bytes()
+            # 直接把原始字节交给 libyaml，UTF-8 在 C 侧解码，省一次 str 拷贝
+            return self._section_from_raw(raw)
+        if st is None:
+            st = os.stat(tracks_yaml_path)
+        digest = self.cache.stat_digest(path_str, st)
+        if digest is None:
+            if raw is None:
+                raw = tracks_yaml_path.read_bytes()
+            digest = hashlib.sha256(raw).digest()
+        # 缓存按 (内容哈希, distro) 存放已物化的段
+        key = (digest, self.distro.lower())
+        section = self.cache.get(key)
+        if section is None:
+            if raw is None:
+                raw = tracks_yaml_path.read_bytes()
+            section = self._section_from_raw(raw)
+            if section is not None:
+                self.cache.put(path_str, st, digest, key, section)
+        return section
+
 
 # ----------------------------- Main Flow -----------------------------
 
+# 明显不含源码包的目录，扫描时直接剪枝
+_SKIP_DIRS = frozenset({
+    ".git", "build", "install", "log", ".colcon", ".vscode",
+    "debian", "rpm", "node_modules",
+})
+
+
 def find_subpackages(pkg_dir: Path):
-    results = []
-    for root, dirs, files in os.walk(pkg_dir):
-        if "package.xml" in files:
-            results.append(Path(root))
-    return results if results else [pkg_dir]
+    """找出 pkg_dir 下所有含 package.xml 的目录。
+
+    手写 os.scandir DFS 替代 os.walk：跳过 build/.git 等已知无关目录，
+    并且命中 package.xml 后不再深入该目录（ROS 包不会嵌套 package.xml），
+    大树上可少做一个数量级的 stat。
+    """
+    # 遍历全程用 str，Path 只在返回边界构造一次，省去热路径上的对象分配
+    results: List[str] = []
+    stack = [str(pkg_dir)]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        found = False
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    name = entry.name
+                    if name == "package.xml" and entry.is_file():
+                        found = True
+                        break
+                    if entry.is_dir(follow_symlinks=False) and name not in _SKIP_DIRS:
+                        subdirs.append(entry.path)
+        except OSError:
+            continue
+        if found:
+            results.append(current)
+        else:
+            stack.extend(subdirs)
+    return [Path(p) for p in results] if results else [pkg_dir]
+
+
+@dataclass
+class PackageTask:
+    """单个包的全部生成参数；worker 进程间无共享状态，可直接并行。"""
+    pkg_name: str
+    pkg_dir: str
+    need_ubuntu: bool
+    need_oe: bool
+    ros_distro: str
+    ubuntu_default: str
+    oe_versions: List[str]
+    bloom_bin: str
+    dry_run: bool
+    generate_gbp: bool
+    release_dir: str
+    done_state: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+@dataclass
+class PackageResult:
+    """worker 的返回值：成功数 + 要写入 fail.log 的记录 + done 清单增量。"""
+    pkg_name: str
+    ok_count: int = 0
+    fail_lines: List[str] = field(default_factory=list)
+    done_updates: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+def process_package(task: PackageTask) -> PackageResult:
+    """在 worker 进程中处理一个包目录（含全部子包）。
+
+    只返回结果，不直接写 fail.log —— 统一由父进程落盘，无需加锁。
+    """
+    result = PackageResult(task.pkg_name)
+    pkg_name = task.pkg_name
+    pkg_dir = Path(task.pkg_dir)
+    subpackages = find_subpackages(pkg_dir)
+    # 软链/嵌套布局可能让同一份 manifest 出现多次；按 (真实路径, 类型)
+    # 去重，避免对同一目录重复跑数秒级的 bloom-generate
+    seen = set()
+    # 子包循环内的不变量只算一次：命令模板（shlex.split）与版本列表
+    deb_base = build_cmd_for('debian', task.bloom_bin)
+    rpm_base = build_cmd_for('rpm', task.bloom_bin)
+
+    for subpkg in subpackages:
+        log(f"[INFO] 处理包: {pkg_name}/{subpkg.relative_to(pkg_dir)}")
+
+        sub_need_ubuntu, sub_need_oe = task.need_ubuntu, task.need_oe
+        sub_key = str(subpkg)
+        sub_done = task.done_state.get(sub_key, {})
+        if sub_need_ubuntu:
+            mt = _control_mtime(subpkg)
+            if mt is not None and sub_done.get("ubuntu") == mt:
+                # done.json 记录的产物未变，免读文件
+                log(f"[RESUME] {pkg_name}: done 清单未变，跳过 ubuntu 生成。")
+                sub_need_ubuntu = False
+            elif is_valid_debian(subpkg):
+                log(f"[RESUME] {pkg_name}: 已有有效 debian，跳过 ubuntu 生成。")
+                sub_need_ubuntu = False
+                if mt is not None:
+                    result.done_updates.setdefault(sub_key, {})["ubuntu"] = mt
+        if sub_need_oe:
+            mt = _spec_mtime(subpkg)
+            if mt is not None and sub_done.get("openeuler") == mt:
+                log(f"[RESUME] {pkg_name}: done 清单未变，跳过 openEuler 生成。")
+                sub_need_oe = False
+            elif is_valid_spec(subpkg):
+                log(f"[RESUME] {pkg_name}: 已有有效 spec，跳过 openEuler 生成。")
+                sub_need_oe = False
+                if mt is not None:
+                    result.done_updates.setdefault(sub_key, {})["openeuler"] = mt
+
+        real = subpkg.resolve()
+        if sub_need_ubuntu:
+            key = (real, "ubuntu")
+            if key in seen:
+                sub_need_ubuntu = False
+            else:
+                seen.add(key)
+        if sub_need_oe:
+            key = (real, "openeuler")
+            if key in seen:
+                sub_need_oe = False
+            else:
+                seen.add(key)
+        if not (sub_need_ubuntu or sub_need_oe):
+            continue
+
+        try:
+            if sub_need_ubuntu:
+                base = deb_base
+                deb_cmd = base + (["agirosdebian"] if not is_direct_module_cmd(base) else []) + [
+                    "--ros-distro", task.ros_distro,
+                    "--os-name", "ubuntu",
+                    "--os-version", task.ubuntu_default,
+                ]
+
+                deb_env = None
+                if task.generate_gbp:
+                    # 通过环境变量把 tracks 目录与目标 distro 注入给 agirosdebian
+                    deb_env = os.environ.copy()
+                    deb_env["OOB_TRACKS_DIR"] = task.release_dir
+                    deb_env["OOB_TRACKS_DISTRO"] = "jazzy"
+                    deb_cmd.append("--generate-gbp")
+                rc, matched = run(deb_cmd, cwd=subpkg, dry_run=task.dry_run, env=deb_env,
+                                  capture_patterns=(ERROR_RE,))
+                if rc == 0:
+                    result.ok_count += 1
+                    log(f"[OK] {pkg_name}: 已生成 debian/ {'(含 gbp.conf)' if task.generate_gbp else ''}")
+                    # dry-run 的 rc==0 并没有真正生成：此时盘上的
+                    # control 可能是旧的甚至无效的，记进 done 清单会让
+                    # 下次真实运行被永久跳过
+                    if not task.dry_run:
+                        mt = _control_mtime(subpkg)
+                        if mt is not None:
+                            result.done_updates.setdefault(sub_key, {})["ubuntu"] = mt
+                else:
+                    result.fail_lines.append(f"{pkg_name} ubuntu 失败 rc={rc}\n")
+                    for l in matched:
+                        prefix = "缺失 rule" if "No agirosdep rule for" in l else "错误输出"
+                        result.fail_lines.append(f"{prefix}: {l}\n")
+
+            if sub_need_oe:
+                success = False
+                for ver in task.oe_versions:
+                    base = rpm_base
+                    rpm_cmd = base + (["agirosrpm"] if not is_direct_module_cmd(base) else []) + [
+                        "--ros-distro", task.ros_distro,
+                        "--os-name", "openeuler",
+                        "--os-version", ver,
+                    ]
+
+                    rc, matched = run(rpm_cmd, cwd=subpkg, dry_run=task.dry_run,
+                                      capture_patterns=(ERROR_RE,))
+                    if rc == 0:
+                        result.ok_count += 1
+                        log(f"[OK] {pkg_name}: 已生成 rpm/ (openeuler:{ver})")
+                        # 同 ubuntu 分支：dry-run 未真正生成，不更新 done 清单
+                        if not task.dry_run:
+                            mt = _spec_mtime(subpkg)
+                            if mt is not None:
+                                result.done_updates.setdefault(sub_key, {})["openeuler"] = mt
+                        success = True
+                        break
+                    else:
+                        result.fail_lines.append(f"{pkg_name} openeuler:{ver} 失败 rc={rc}\n")
+                        for l in matched:
+                            prefix = "缺失 rule" if "No agirosdep rule for" in l else "错误输出"
+                            result.fail_lines.append(f"{prefix}: {l}\n")
+                if not success:
+                    log(f"[ERR] {pkg_name}: 所有 openEuler 版本均失败")
+
+        except Exception as e:
+            result.fail_lines.append(f"{pkg_name} 异常: {e}\n")
+            log(f"[ERR] {pkg_name}: 发生异常 {e}")
+
+    return result
+
+
+def _scan_release_child(item):
+    """检查一个 release_dir 子目录是否带 tracks.yaml；供线程池并发调用。"""
+    name, path = item
+    for fname in ("tracks.yaml", "track.yaml"):
+        p = os.path.join(path, fname)
+        if os.path.exists(p):
+            return (name, Path(p))
+    return None
 
 
 def main():
@@ -201,121 +671,99 @@ def main():
     release_dir = Path(args.release_dir)
     code_dir = Path(args.code_dir)
     fail_log = Path("fail.log")
+    # openEuler 尝试顺序对所有包相同，循环外算一次
+    oe_versions = [args.openeuler_default,
+                   *[v for v in args.openeuler_fallback if v != args.openeuler_default]]
 
     log(f"[INFO] 初始化 OOB Builder: code_dir={code_dir}, release_dir={release_dir}")
-
-    parser = TracksParser("jazzy")
-    pkgs = []
-    for child in sorted(release_dir.iterdir()):
-        if not child.is_dir():
-            continue
-        for name in ("tracks.yaml", "track.yaml"):
-            p = child / name
-            if p.exists():
-                pkgs.append((child.name, p))
-                break
+    if not _HAS_LIBYAML:
+        log("[WARN] 未检测到 libyaml（CSafeLoader），YAML 解析回退到纯 Python 实现")
+
+    tracks_cache = TracksCache(fail_log.parent / "tracks_cache.pkl")
+    atexit.register(tracks_cache.save)
+    done_path = fail_log.parent / "done.json"
+    done_state = _load_done_state(done_path)
+    parser = TracksParser("jazzy", cache=tracks_cache)
+    # 纯文件系统 I/O：scandir 枚举（is_dir 复用缓存的 stat），
+    # 候选存在性检查交给线程池并发做，高延迟文件系统上近线性加速。
+    with os.scandir(release_dir) as it:
+        children = sorted((e.name, e.path) for e in it if e.is_dir())
+    with ThreadPoolExecutor(max_workers=32) as ex:
+        pkgs = [r for r in ex.map(_scan_release_child, children) if r is not None]
 
     log(f"[INFO] 开始扫描 release_dir... 共发现 {len(pkgs)} 个含 tracks.yaml 的包目录")
 
-    total = 0
-    with fail_log.open("w", encoding="utf-8") as flog:
-        for pkg_name, yaml_path in pkgs[: args.limit or len(pkgs)]:
-            section = parser.parse_file(yaml_path)
-            if not section:
-                log(f"[SKIP] {pkg_name}: 无 jazzy 段")
-                continue
+    # 先串行收集任务（tracks.yaml 解析很便宜），再并行执行
+    candidates = []
+    for pkg_name, yaml_path in pkgs[: args.limit or len(pkgs)]:
+        # 代码还没 clone 的包一个 stat 就能排除，不必先解析整份 YAML
+        pkg_dir = code_dir / pkg_name
+        if not pkg_dir.is_dir():
+            log(f"[SKIP] code_dir 中不存在: {pkg_dir}")
+            continue
+        candidates.append((pkg_name, yaml_path, pkg_dir))
 
-            actions = section.get("actions") or []
-            if not actions:
-                log(f"[SKIP] {pkg_name}: jazzy.actions 为空")
-                continue
+    # 并发预读要解析的 tracks.yaml，把磁盘延迟和后面的串行解析重叠起来
+    parser.prefetch([yp for _, yp, _ in candidates])
 
-            # 检测需求
-            need_ubuntu = any("--os-name ubuntu" in a for a in actions)
-            need_oe = any("--os-name openeuler" in a for a in actions) or any("--os-name rhel" in a for a in actions)
-            if not (need_ubuntu or need_oe):
-                log(f"[SKIP] {pkg_name}: 无 ubuntu/openeuler 相关 actions")
-                continue
+    tasks: List[PackageTask] = []
+    for pkg_name, yaml_path, pkg_dir in candidates:
+        section = parser.parse_file(yaml_path)
+        if not section:
+            log(f"[SKIP] {pkg_name}: 无 jazzy 段")
+            continue
 
-            pkg_dir = code_dir / pkg_name
-            if not pkg_dir.is_dir():
-                log(f"[SKIP] code_dir 中不存在: {pkg_dir}")
+        actions = section.get("actions") or []
+        if not actions:
+            log(f"[SKIP] {pkg_name}: jazzy.actions 为空")
+            continue
+
+        # 检测需求：单趟扫描同时置两个标志，双双命中即提前退出
+        # （替代原来的三次 any(...) 全列表子串扫描）
+        need_ubuntu = need_oe = False
+        for a in actions:
+            if "--os-name " not in a:
                 continue
+            if "ubuntu" in a:
+                need_ubuntu = True
+            elif "openeuler" in a or "rhel" in a:
+                need_oe = True
+            if need_ubuntu and need_oe:
+                break
+        if not (need_ubuntu or need_oe):
+            log(f"[SKIP] {pkg_name}: 无 ubuntu/openeuler 相关 actions")
+            continue
 
-            subpackages = find_subpackages(pkg_dir)
-
-            for subpkg in subpackages:
-                log(f"[INFO] 处理包: {pkg_name}/{subpkg.relative_to(pkg_dir)}")
-
-                sub_need_ubuntu, sub_need_oe = need_ubuntu, need_oe
-                if sub_need_ubuntu and is_valid_debian(subpkg):
-                    log(f"[RESUME] {pkg_name}: 已有有效 debian，跳过 ubuntu 生成。")
-                    sub_need_ubuntu = False
-                if sub_need_oe and is_valid_spec(subpkg):
-                    log(f"[RESUME] {pkg_name}: 已有有效 spec，跳过 openEuler 生成。")
-                    sub_need_oe = False
-                if not (sub_need_ubuntu or sub_need_oe):
-                    continue
-
-                try:
-                    if sub_need_ubuntu:
-                        base = build_cmd_for('debian', args.bloom_bin)
-                        deb_cmd = base + (["agirosdebian"] if not is_direct_module_cmd(base) else []) + [
-                            "--ros-distro", args.ros_distro,
-                            "--os-name", "ubuntu",
-                            "--os-version", args.ubuntu_default,
-                        ]
-
-                        deb_env = None
-                        if args.generate_gbp:
-                            # 通过环境变量把 tracks 目录与目标 distro 注入给 agirosdebian
-                            deb_env = os.environ.copy()
-                            deb_env["OOB_TRACKS_DIR"] = str(release_dir)
-                            deb_env["OOB_TRACKS_DISTRO"] = "jazzy"
-                            deb_cmd.append("--generate-gbp")
-                        rc, out = run(deb_cmd, cwd=subpkg, dry_run=args.dry_run, env=deb_env)
-                        if rc == 0:
-                            total += 1
-                            log(f"[OK] {pkg_name}: 已生成 debian/ {'(含 gbp.conf)' if args.generate_gbp else ''}")
-                        else:
-                            with fail_log.open("a", encoding="utf-8") as flog2:
-                                flog2.write(f"{pkg_name} ubuntu 失败 rc={rc}\n")
-                                if out:
-                                    for l in out.splitlines():
-                                        if "No agirosdep rule for" in l:
-                                            flog2.write(f"缺失 rule: {l}\n")
-
-                    if sub_need_oe:
-                        versions = [args.openeuler_default] + [v for v in args.openeuler_fallback if v != args.openeuler_default]
-                        success = False
-                        for ver in versions:
-                            base = build_cmd_for('rpm', args.bloom_bin)
-                            rpm_cmd = base + (["agirosrpm"] if not is_direct_module_cmd(base) else []) + [
-                                "--ros-distro", args.ros_distro,
-                                "--os-name", "openeuler",
-                                "--os-version", ver,
-                            ]
-
-                            rc, out = run(rpm_cmd, cwd=subpkg, dry_run=args.dry_run)
-                            if rc == 0:
-                                total += 1
-                                log(f"[OK] {pkg_name}: 已生成 rpm/ (openeuler:{ver})")
-                                success = True
-                                break
-                            else:
-                                with fail_log.open("a", encoding="utf-8") as flog2:
-                                    flog2.write(f"{pkg_name} openeuler:{ver} 失败 rc={rc}\n")
-                                    if out:
-                                        for l in out.splitlines():
-                                            if "No agirosdep rule for" in l:
-                                                flog2.write(f"缺失 rule: {l}\n")
-                        if not success:
-                            log(f"[ERR] {pkg_name}: 所有 openEuler 版本均失败")
-
-                except Exception as e:
-                    with fail_log.open("a", encoding="utf-8") as flog2:
-                        flog2.write(f"{pkg_name} 异常: {e}\n")
-                    log(f"[ERR] {pkg_name}: 发生异常 {e}")
+        tasks.append(PackageTask(
+            pkg_name=pkg_name,
+            pkg_dir=str(pkg_dir),
+            need_ubuntu=need_ubuntu,
+            need_oe=need_oe,
+            ros_distro=args.ros_distro,
+            ubuntu_default=args.ubuntu_default,
+            oe_versions=oe_versions,
+            bloom_bin=args.bloom_bin,
+            dry_run=args.dry_run,
+            generate_gbp=args.generate_gbp,
+            release_dir=str(release_dir),
+            done_state=done_state,
+        ))
+
+    # 每个包就是一次独立的 bloom-generate 子进程调用，互相无共享状态，
+    # 属于典型的可并行外层循环；fail.log 只在父进程写入。
+    total = 0
+    # fail.log 由父进程独占：64KiB 缓冲 + 每个结果合并成一次 write，
+    # 把逐行 I/O 摊平成少量大块写，也天然不存在并发写竞争。
+    with fail_log.open("w", encoding="utf-8", buffering=1 << 16) as flog:
+        if tasks:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+                for res in ex.map(process_package, tasks, chunksize=4):
+                    total += res.ok_count
+                    if res.fail_lines:
+                        flog.write("".join(res.fail_lines))
+                    for sub_key, kinds in res.done_updates.items():
+                        done_state.setdefault(sub_key, {}).update(kinds)
+    _save_done_state(done_path, done_state)
 
     log(f"[INFO] 所有包处理完成。成功生成数：{total}")
     log(f"[INFO] 失败记录已保存到 {fail_log}")
@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
+import atexit
+import hashlib
 import json
 import os
 import platform
+import re
 import shlex
 import sys
 import subprocess
+import threading
+import time
+import multiprocessing
+import queue
+from collections import ChainMap, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
 
 try:
     from rich import box
@@ -18,16 +28,81 @@ try:
 except ImportError as exc:  # pragma: no cover - rich is required for this CLI
     raise RuntimeError("rich is required to run agiros_tools_menu.py") from exc
 
-try:
-    import questionary
-except Exception:
-    questionary = None
+# questionary 及其 prompt_toolkit 依赖图较重，推迟到第一次交互提问时
+# 再导入：只跑非交互路径（批量构建、脚本化调用）的进程不再付导入成本。
+_questionary: Any = None
+_questionary_checked = False
+
+
+def _get_questionary() -> Any:
+    global _questionary, _questionary_checked
+    if not _questionary_checked:
+        _questionary_checked = True
+        try:
+            import questionary as _mod
+            _questionary = _mod
+        except Exception:
+            _questionary = None
+    return _questionary
+
+
+@lru_cache(maxsize=512)
+def _resolve(p: str) -> Path:
+    """expanduser + resolve，按输入字符串记忆化。
+
+    resolve() 对每个路径分量都有系统调用；菜单各处反复归一化同一批
+    目录（code_dir、release_dir、队列里的包路径），缓存后一个会话内
+    每个路径只解析一次。解析失败时缓存未解析的展开结果。
+    """
+    path = Path(p).expanduser()
+    try:
+        return path.resolve()
+    except Exception:
+        return path
 
 
 console = Console()
+# 子进程日志专用 Console：关闭 markup/高亮/emoji 解析，避免对大体量
+# 构建输出逐行跑 Rich 的正则；菜单与面板仍用上面的富文本 console。
+plain_console = Console(highlight=False, markup=False, emoji=False, soft_wrap=True)
 REPO_ROOT = Path(__file__).resolve().parent
 
 
+@lru_cache(maxsize=8)
+def _script_path(name: str) -> Optional[Path]:
+    """仓库内辅助脚本的存在性探测，按脚本名记忆化。
+
+    构建分发热路径里每个包都要 stat 一次 git_build_any.sh 等脚本；
+    脚本在一次会话内不会出现/消失，缓存后每个脚本只探测一次。
+    """
+    path = REPO_ROOT / name
+    return path if path.exists() else None
+
+
+@lru_cache(maxsize=8)
+def _script_argv(name: str) -> Optional[Tuple[str, ...]]:
+    """脚本调用 argv：带执行权限时直接 exec（内核走 shebang），
+    省掉一次 bash 的 fork+exec；不可执行时回退 bash 调用。"""
+    script = _script_path(name)
+    if script is None:
+        return None
+    if os.access(script, os.X_OK):
+        return (str(script),)
+    return ("bash", str(script))
+
+
+# 固定菜单项提为模块级常量，循环重绘不再每轮重建列表；
+# 带分发表的菜单（主菜单/配置/构建参数）在各自分发表旁派生。
+_QUEUE_MENU: Tuple[str, ...] = (
+    "查看队列",
+    "添加任务",
+    "执行队列",
+    "清空队列",
+    "编辑构建参数",
+    "返回",
+)
+
+
 def _fallback_select(message: str, choices: Sequence[str], multiselect: bool = False):
     if not choices:
         return [] if multiselect else None
@@ -57,18 +132,21 @@ def _fallback_select(message: str, choices: Sequence[str], multiselect: bool = F
 
 
 def ask_select(message: str, choices: Sequence[str]) -> Optional[str]:
+    questionary = _get_questionary()
     if questionary:
         return questionary.select(message, choices=list(choices)).unsafe_ask()
     return _fallback_select(message, choices)
 
 
 def ask_checkbox(message: str, choices: Sequence[str]) -> List[str]:
+    questionary = _get_questionary()
     if questionary:
         return questionary.checkbox(message, choices=list(choices)).unsafe_ask()
     return _fallback_select(message, choices, multiselect=True)
 
 
 def ask_text(message: str, default: Optional[str] = None) -> Optional[str]:
+    questionary = _get_questionary()
     if questionary:
         return questionary.text(message, default=default or "").unsafe_ask()
     prompt = f"{message}"
@@ -80,6 +158,7 @@ def ask_text(message: str, default: Optional[str] = None) -> Optional[str]:
 
 
 def ask_confirm(message: str, default: bool = True) -> bool:
+    questionary = _get_questionary()
     if questionary:
         return questionary.confirm(message, default=default).unsafe_ask()
     suffix = "Y/n" if default else "y/N"
@@ -89,27 +168,54 @@ def ask_confirm(message: str, default: bool = True) -> bool:
     return raw in {"y", "yes"}
 
 
-def run_stream(cmd: Sequence[str], cwd: Optional[Path] = None, env: Optional[Dict[str, str]] = None) -> int:
+def run_stream(cmd: Sequence[str], cwd: Optional[Path] = None, env: Optional[Mapping[str, str]] = None) -> int:
     display = " ".join(shlex.quote(str(x)) for x in cmd)
     working_dir = str(cwd or Path.cwd())
     console.print(f"[bold blue]$[/] {display}\n   [dim]cwd={working_dir}[/]")
+    popen_kwargs: Dict[str, Any] = {}
+    if sys.version_info >= (3, 10):
+        # 加大管道容量（默认 64KiB）：子进程大段输出时更少因管道
+        # 写满而阻塞，读端也能一次取走更大的块。
+        popen_kwargs["pipesize"] = 1 << 20
     proc = subprocess.Popen(
         list(map(str, cmd)),
         cwd=str(cwd) if cwd else None,
         env=env,
-        text=True,
+        bufsize=-1,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
+        **popen_kwargs,
     )
-    assert proc.stdout is not None
-    for line in proc.stdout:
-        console.print(line.rstrip())
+    # 二进制管道 + read1 透传：不经 utf-8 解码/再编码，也不经 Rich；
+    # 非 UTF-8 locale 的构建输出原样写出。Rich 只负责命令头与失败提示。
+    stream = proc.stdout
+    out = sys.stdout.buffer
+    while True:
+        chunk = stream.read1(1 << 16)
+        if not chunk:
+            break
+        out.write(chunk)
+        out.flush()
     proc.wait()
     if proc.returncode != 0:
         console.print(f"[bold red]命令退出码: {proc.returncode}[/]")
     return proc.returncode
 
 
+def run_direct(cmd: Sequence[str], cwd: Optional[Path] = None, env: Optional[Mapping[str, str]] = None) -> int:
+    """只关心退出码的命令：stdout/stderr 直接继承终端，
+
+    每个字节不再经 Python 管道转发一遍；输出顺序与颜色由子进程自理。
+    """
+    display = " ".join(shlex.quote(str(x)) for x in cmd)
+    working_dir = str(cwd or Path.cwd())
+    console.print(f"[bold blue]$[/] {display}\n   [dim]cwd={working_dir}[/]")
+    rc = subprocess.call(list(map(str, cmd)), cwd=str(cwd) if cwd else None, env=env)
+    if rc != 0:
+        console.print(f"[bold red]命令退出码: {rc}[/]")
+    return rc
+
+
 def shlex_split(value: str) -> List[str]:
     return shlex.split(value) if value.strip() else []
 
@@ -121,12 +227,14 @@ class BuildTask:
     kind: str  # debian | rpm
     extra_args: List[str] = field(default_factory=list)
 
+    def __post_init__(self) -> None:
+        # 名称与类型不变，描述前缀建任务时拼一次，队列渲染直接复用
+        self._desc = f"{self.display_name} ({self.kind})"
+
 
 def to_display_name(state: "MenuState", pkg_path: Path) -> str:
-    try:
-        return str(pkg_path.relative_to(state.code_dir))
-    except ValueError:
-        return str(pkg_path)
+    # 一次字符串前缀剥离代替 relative_to 的逐段比较；不在源码目录下原样返回
+    return str(pkg_path).removeprefix(state._code_prefix)
 
 
 @dataclass
@@ -158,6 +266,33 @@ class MenuState:
     package_status: Dict[str, bool] = field(default_factory=dict)
 
     def __post_init__(self) -> None:
+        # (mtime_ns, size) 键控的解析缓存：菜单每次重绘都会 refresh_from_env →
+        # load_queue_from_file，文件没变时跳过逐行解析与 json.loads。
+        self._queue_cache: Optional[Tuple[Tuple[int, int], List[str], Dict[str, bool], Dict[str, Dict[str, Any]]]] = None
+        self._meta_cache: Optional[Tuple[Tuple[int, int], Dict[str, Dict[str, object]]]] = None
+        # 后台落盘：save_queue 只置脏标记，写线程去抖后统一刷盘，
+        # 连续 append N 个包不再产生 N 次全量 JSON 编码 + 写文件。
+        self._flush_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._writer_thread: Optional[threading.Thread] = None
+        # ensure_queue_file 的一次性门闩：记录已确保过的 (队列, 元数据) 路径对，
+        # 路径未变时跳过 4 次 stat/mkdir。
+        self._ensured_for: Optional[Tuple[Path, Path]] = None
+        # 包名 -> 任务列表索引：按包查任务从 O(N·M) 的列表过滤降为一次哈希查找
+        self.tasks_by_pkg: Dict[str, List[BuildTask]] = {}
+        # 环境模板快照：构建分发不再每包 os.environ.copy()，而是在这份
+        # 模板上补少量键一次构造；update_env 后刷新。
+        self._env_template: Dict[str, str] = dict(os.environ)
+        # 队列渲染用的路径别名前缀，update_env 后刷新
+        self._label_prefix = f"{self.code_label}/"
+        # 源码目录字符串前缀：to_display_name 用一次 removeprefix 代替
+        # 每包 relative_to 的逐段比较；code_dir 变更处同步刷新
+        self._code_prefix = str(self.code_dir) + os.sep
+        # 构建事件环形缓冲：并行执行时逐包完成通知先入环，
+        # 菜单重绘时汇总展示，避免富文本样式解析打断批量输出。
+        self._log_ring: deque = deque(maxlen=10000)
+        # rpmbuild 基础 argv 元组，spec 循环直接展开；update_env 后刷新
+        self._rpm_base_argv: Tuple[str, ...] = (self.rpm_build_base, *self.rpm_build_args)
         self.queue_file = self._normalize_path(self.queue_file)
         queue_meta_env = os.environ.get("AGIROS_QUEUE_META")
         if queue_meta_env:
@@ -170,7 +305,7 @@ class MenuState:
     def _normalize_path(self, value: Union[str, Path]) -> Path:
         path = Path(value).expanduser()
         if not path.is_absolute():
-            path = (REPO_ROOT / path).resolve()
+            path = _resolve(str(REPO_ROOT / path))
         return path
 
     def _meta_path_for_queue(self, queue_path: Path) -> Path:
@@ -201,8 +336,16 @@ class MenuState:
             "AGIROS_QUEUE_FILE": str(self.queue_file),
             "AGIROS_QUEUE_META": str(self.queue_meta_file),
         }
+        # 只写入有变化的键：update_env 在每个菜单动作后都会被调用，
+        # 无脑赋值等于每次 ~20 个 putenv 系统调用。
+        environ = os.environ
         for key, value in mappings.items():
-            os.environ[key] = value
+            if environ.get(key) != value:
+                environ[key] = value
+        self._env_template = dict(environ)
+        self._label_prefix = f"{self.code_label}/"
+        self._code_prefix = str(self.code_dir) + os.sep
+        self._rpm_base_argv = (self.rpm_build_base, *self.rpm_build_args)
 
     def refresh_from_env(self) -> None:
         """Sync state fields from process-wide environment variables."""
@@ -216,11 +359,7 @@ class MenuState:
                 path = self._normalize_path(value)
                 self.queue_meta_file = self._meta_path_for_queue(path)
             else:
-                path = Path(value).expanduser()
-                try:
-                    path = path.resolve()
-                except Exception:
-                    pass
+                path = _resolve(value)
             setattr(self, attr, path)
 
         def _set_str(env_key: str, attr: str) -> None:
@@ -263,75 +402,134 @@ class MenuState:
             _set_path("AGIROS_QUEUE_META", "queue_meta_file")
         else:
             self.queue_meta_file = self._meta_path_for_queue(self.queue_file)
+        self._rpm_base_argv = (self.rpm_build_base, *self.rpm_build_args)
+        self._code_prefix = str(self.code_dir) + os.sep
         self.ensure_queue_file()
         self.load_queue_from_file()
 
     def ensure_queue_file(self) -> None:
+        key = (self.queue_file, self.queue_meta_file)
+        if self._ensured_for == key:
+            return
         path = self.queue_file
-        parent = path.parent
-        if not parent.exists():
-            parent.mkdir(parents=True, exist_ok=True)
+        # mkdir 幂等，免去前置 exists()；文件创建保留判断（touch 会刷 mtime）
+        path.parent.mkdir(parents=True, exist_ok=True)
         if not path.exists():
             path.touch()
-        meta_parent = self.queue_meta_file.parent
-        if not meta_parent.exists():
-            meta_parent.mkdir(parents=True, exist_ok=True)
+        self.queue_meta_file.parent.mkdir(parents=True, exist_ok=True)
         if not self.queue_meta_file.exists():
             self.queue_meta_file.write_text("{}", encoding="utf-8")
+        self._ensured_for = key
 
     def load_queue_from_file(self) -> List[BuildTask]:
+        # 有未落盘的修改时先刷盘，避免用磁盘上的旧内容覆盖内存状态
+        if self._dirty.is_set():
+            self.flush_queue()
         path = self.queue_file
         if not path.exists():
             self.build_queue = []
             self.queue_packages = []
             self.package_status = {}
+            self.tasks_by_pkg = {}
             return []
+        try:
+            queue_stat = path.stat()
+            queue_key: Optional[Tuple[int, int]] = (queue_stat.st_mtime_ns, queue_stat.st_size)
+        except OSError:
+            queue_key = None
+        cached = self._queue_cache
+        if cached is not None and queue_key is not None and cached[0] == queue_key:
+            packages = list(cached[1])
+            status = dict(cached[2])
+            legacy_meta = cached[3]
+            return self._finish_load(packages, status, legacy_meta)
         packages: List[str] = []
+        seen_names: set = set()
         status: Dict[str, bool] = {}
         legacy_meta: Dict[str, Dict[str, Any]] = {}
-        with path.open("r", encoding="utf-8") as handle:
-            for raw_line in handle:
-                line = raw_line.strip()
-                if not line:
+        def _record(name: str, completed: bool) -> None:
+            if name:
+                name = Path(name).name
+            if not name:
+                return
+            if name not in seen_names:
+                seen_names.add(name)
+                packages.append(name)
+            status[name] = status.get(name, False) or completed
+
+        # 整文件一次读入（bytes），按首个非空白字节嗅探格式：
+        # '[' -> 单个 JSON 数组；否则逐行。绝大多数行是纯包名，
+        # 热路径只做字节级 '#' 判断 + decode；JSON 任务行走冷路径辅助函数。
+        raw = path.read_bytes()
+        if raw.lstrip()[:1] == b"[":
+            try:
+                loaded_entries = json.loads(raw)
+            except ValueError:
+                loaded_entries = []
+            if isinstance(loaded_entries, list):
+                for parsed in loaded_entries:
+                    if isinstance(parsed, dict) and parsed.get("name"):
+                        _record(*self._parse_queue_json_entry(parsed, legacy_meta))
+                    elif isinstance(parsed, str):
+                        stripped = parsed.strip()
+                        if stripped.endswith("#"):
+                            _record(stripped[:-1].strip(), True)
+                        else:
+                            _record(stripped, False)
+        else:
+            for bline in raw.splitlines():
+                bline = bline.strip()
+                if not bline:
                     continue
-                parsed: Optional[Any] = None
-                if line.startswith("{") and line.endswith("}"):
+                if bline[:1] == b"{":
                     try:
-                        parsed = json.loads(line)
-                    except json.JSONDecodeError:
+                        parsed = json.loads(bline)
+                    except ValueError:
                         parsed = None
-                completed = False
-                name = ""
-                if isinstance(parsed, dict) and parsed.get("name"):
-                    name = str(parsed.get("name") or "").strip()
-                    completed = bool(parsed.get("completed", False))
-                    kind = str(parsed.get("kind", "debian"))
-                    path_str = str(parsed.get("path") or "")
-                    extra_raw = parsed.get("extra_args")
-                    extra_list: List[str] = []
-                    if isinstance(extra_raw, list):
-                        extra_list = [str(item) for item in extra_raw]
-                    elif extra_raw:
-                        extra_list = [str(extra_raw)]
-                    entry = legacy_meta.setdefault(name, {"path": path_str, "kinds": {}})
-                    if path_str:
-                        entry["path"] = path_str
-                    kinds_dict = entry.setdefault("kinds", {})
-                    if isinstance(kinds_dict, dict):
-                        kinds_dict[kind] = {"extra_args": extra_list}
-                else:
-                    if line.endswith("#"):
-                        completed = True
-                        line = line[:-1].strip()
-                    name = line.strip()
-                if name:
-                    name = Path(name).name
-                if not name:
-                    continue
-                if name not in packages:
-                    packages.append(name)
-                status[name] = status.get(name, False) or completed
-
+                    if isinstance(parsed, dict) and parsed.get("name"):
+                        _record(*self._parse_queue_json_entry(parsed, legacy_meta))
+                        continue
+                    # 解析失败：按普通包名行处理（与历史行为一致）
+                completed = bline.endswith(b"#")
+                if completed:
+                    bline = bline[:-1].strip()
+                _record(bline.decode("utf-8", "replace").strip(), completed)
+
+        if queue_key is not None:
+            self._queue_cache = (queue_key, list(packages), dict(status), legacy_meta)
+        return self._finish_load(packages, status, legacy_meta)
+
+    @staticmethod
+    def _parse_queue_json_entry(parsed: Dict[str, Any], legacy_meta: Dict[str, Dict[str, Any]]) -> Tuple[str, bool]:
+        """冷路径：解析 JSON 任务行并并入 legacy_meta，返回 (name, completed)。"""
+        name = str(parsed.get("name") or "").strip()
+        completed = bool(parsed.get("completed", False))
+        kind = str(parsed.get("kind", "debian"))
+        path_str = str(parsed.get("path") or "")
+        extra_raw = parsed.get("extra_args")
+        extra_list: List[str] = []
+        if isinstance(extra_raw, list):
+            extra_list = [str(item) for item in extra_raw]
+        elif extra_raw:
+            extra_list = [str(extra_raw)]
+        entry = legacy_meta.setdefault(name, {"path": path_str, "kinds": {}})
+        if path_str:
+            entry["path"] = path_str
+        kinds_dict = entry.setdefault("kinds", {})
+        if isinstance(kinds_dict, dict):
+            kinds_dict[kind] = {"extra_args": extra_list}
+        return name, completed
+
+    def _load_meta(self) -> Dict[str, Dict[str, object]]:
+        """读取并归一化 queue_meta_file，(mtime_ns, size) 命中时跳过解析。"""
+        try:
+            meta_stat = self.queue_meta_file.stat()
+            meta_key: Optional[Tuple[int, int]] = (meta_stat.st_mtime_ns, meta_stat.st_size)
+        except OSError:
+            meta_key = None
+        cached = self._meta_cache
+        if cached is not None and meta_key is not None and cached[0] == meta_key:
+            return dict(cached[1])
         meta: Dict[str, Dict[str, object]]
         try:
             meta_raw = self.queue_meta_file.read_text(encoding="utf-8")
@@ -363,6 +561,17 @@ class MenuState:
                     normalized_meta[new_key] = value
             meta = normalized_meta
 
+        if meta_key is not None:
+            self._meta_cache = (meta_key, meta)
+        return dict(meta)
+
+    def _finish_load(
+        self,
+        packages: List[str],
+        status: Dict[str, bool],
+        legacy_meta: Dict[str, Dict[str, Any]],
+    ) -> List[BuildTask]:
+        meta = self._load_meta()
         if legacy_meta:
             for pkg, info in legacy_meta.items():
                 existing = meta.get(pkg) if isinstance(meta.get(pkg), dict) else {}
@@ -388,13 +597,9 @@ class MenuState:
             else:
                 kinds_info = {}
             if base_path_str:
-                base_path = Path(base_path_str).expanduser()
+                base_path = _resolve(base_path_str)
             else:
-                base_path = (self.code_dir / pkg).expanduser()
-            try:
-                base_path = base_path.resolve()
-            except Exception:
-                pass
+                base_path = _resolve(str(self.code_dir / pkg))
             if not kinds_info:
                 tasks.append(BuildTask(display_name=pkg, path=base_path, kind="debian", extra_args=[]))
                 continue
@@ -411,54 +616,90 @@ class MenuState:
         self.queue_packages = packages
         self.package_status = status
         self.build_queue = tasks
+        self._reindex_tasks()
         return tasks
 
+    def _reindex_tasks(self) -> None:
+        index: Dict[str, List[BuildTask]] = {}
+        for task in self.build_queue:
+            index.setdefault(task.display_name, []).append(task)
+        self.tasks_by_pkg = index
+
     def save_queue(self, tasks: Optional[List[BuildTask]] = None) -> None:
-        tasks = list(tasks if tasks is not None else self.build_queue)
-        unique: List[BuildTask] = []
-        seen = set()
-        for task in tasks:
+        # 单趟扫描：dict 去重（保留首个同键任务）+ 插入有序的包名索引，
+        # 取代原先 去重/补序/过滤空包/重建队列 四次遍历。
+        tasks_src = tasks if tasks is not None else self.build_queue
+        unique: Dict[Tuple[str, str], BuildTask] = {}
+        pkg_order: Dict[str, None] = {}
+        for task in tasks_src:
             package_name = task.path.name
             task.display_name = package_name
-            key = (package_name, task.kind)
-            if key in seen:
-                continue
-            seen.add(key)
-            unique.append(task)
-        tasks = unique
-        package_order = list(self.queue_packages)
-        for task in tasks:
-            package_name = task.path.name
-            if package_name not in package_order:
-                package_order.append(package_name)
-        # Remove packages without tasks
-        package_order = [pkg for pkg in package_order if any(t.path.name == pkg for t in tasks)]
-        status = {pkg: self.package_status.get(pkg, False) for pkg in package_order}
-        self.queue_packages = package_order
-        self.package_status = status
-        self.build_queue = []
-        for task in tasks:
-            task.display_name = task.path.name
-            self.build_queue.append(task)
-        self._write_queue_file()
-        self._write_meta_from_tasks(tasks)
+            unique.setdefault((package_name, task.kind), task)
+            pkg_order.setdefault(package_name, None)
+        # 既有队列顺序优先，仅保留仍有任务的包，再追加新包
+        ordered = [pkg for pkg in self.queue_packages if pkg in pkg_order]
+        ordered_seen = set(ordered)
+        for pkg in pkg_order:
+            if pkg not in ordered_seen:
+                ordered.append(pkg)
+        self.queue_packages = ordered
+        self.package_status = {pkg: self.package_status.get(pkg, False) for pkg in ordered}
+        self.build_queue = list(unique.values())
+        self._reindex_tasks()
+        self._mark_dirty()
+
+    def log(self, message: str) -> None:
+        """构建事件入环形缓冲，菜单重绘时汇总展示最近若干条。"""
+        self._log_ring.append((time.strftime("%H:%M:%S"), message))
+
+    def _mark_dirty(self) -> None:
+        """标脏并确保写线程已启动；进程退出前 atexit 兜底刷盘。"""
+        if self._writer_thread is None:
+            self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer_thread.start()
+            atexit.register(self.flush_queue)
+        self._dirty.set()
+
+    def _writer_loop(self) -> None:
+        while True:
+            self._dirty.wait()
+            time.sleep(0.2)  # 去抖：聚合一连串 save_queue
+            self.flush_queue()
+
+    def flush_queue(self) -> None:
+        """把内存中的队列状态同步落盘（幂等，线程安全）。"""
+        with self._flush_lock:
+            if not self._dirty.is_set():
+                return
+            self._dirty.clear()
+            self._write_queue_file()
+            self._write_meta_from_tasks(self.build_queue)
 
     def append_task_to_queue(self, task: BuildTask) -> None:
         self.add_tasks([task])
 
+    def append_tasks_to_queue(self, tasks: Sequence[BuildTask]) -> None:
+        """批量入队：所有任务一次合并、save_queue 只跑一趟。"""
+        self.add_tasks(list(tasks))
+
     def clear_queue(self) -> None:
         self.ensure_queue_file()
+        self._dirty.clear()  # 直接写空文件，丢弃未落盘的修改
+        self._queue_cache = None
+        self._meta_cache = None
         self.queue_file.write_text("", encoding="utf-8")
         self.queue_meta_file.write_text("{}", encoding="utf-8")
         self.queue_packages = []
         self.package_status = {}
         self.build_queue = []
+        self.tasks_by_pkg = {}
 
     def add_tasks(self, tasks: Sequence[BuildTask], *, reset_completed: bool = True) -> Tuple[int, int]:
         if not tasks:
             return (0, 0)
         added = 0
         total = 0
+        queued = set(self.queue_packages)
         for task in tasks:
             total += 1
             package_name = task.path.name
@@ -474,7 +715,8 @@ class MenuState:
             if not replaced:
                 self.build_queue.append(task)
                 added += 1
-            if package_name not in self.queue_packages:
+            if package_name not in queued:
+                queued.add(package_name)
                 self.queue_packages.append(package_name)
             if not replaced:
                 self.package_status[package_name] = False
@@ -485,14 +727,30 @@ class MenuState:
         self.save_queue()
         return added, total
 
+    @staticmethod
+    def _atomic_write(target: Path, data: bytes) -> None:
+        """写临时文件 + os.replace：崩溃时旧文件保持完整。
+
+        不做 fsync：rename 在同一文件系统上原子可见，掉电最坏回到
+        旧版本而不会出现撕裂文件；省掉热路径上每次落盘的强制刷盘等待。
+        """
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        with open(tmp, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp, target)
+
     def _write_queue_file(self) -> None:
         self.ensure_queue_file()
-        with self.queue_file.open("w", encoding="utf-8") as handle:
-            for pkg in self.queue_packages:
-                suffix = "#" if self.package_status.get(pkg) else ""
-                handle.write(f"{pkg}{suffix}\n")
+        self._queue_cache = None
+        # 整个文件先在内存拼好，一次写盘（_atomic_write 单次 write + replace）
+        status = self.package_status
+        payload = "".join(
+            f"{pkg}#\n" if status.get(pkg) else f"{pkg}\n" for pkg in self.queue_packages
+        ).encode("utf-8")
+        self._atomic_write(self.queue_file, payload)
 
     def _write_meta_from_tasks(self, tasks: List[BuildTask]) -> None:
+        self._meta_cache = None
         meta: Dict[str, Dict[str, object]] = {}
         for task in tasks:
             entry = meta.setdefault(task.display_name, {"path": str(task.path), "kinds": {}})
@@ -500,7 +758,8 @@ class MenuState:
             kinds = entry.setdefault("kinds", {})
             if isinstance(kinds, dict):
                 kinds[task.kind] = {"extra_args": list(task.extra_args)}
-        self.queue_meta_file.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        payload = json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8")
+        self._atomic_write(self.queue_meta_file, payload)
 
     def summary_rows(self) -> List[Tuple[str, str]]:
         return [
@@ -527,19 +786,41 @@ class MenuState:
         ]
 
 
+# 状态面板缓存：summary_rows 未变时复用上次构建好的 Panel，
+# 免去每次重绘的 20 次字符串格式化 + Table/Panel 组装。
+_panel_cache: Optional[Tuple[int, Panel]] = None
+
+
 def render_state_panel(state: MenuState) -> None:
+    global _panel_cache
     state.refresh_from_env()
+    rows = state.summary_rows()
+    key = hash(tuple(rows))
+    if _panel_cache is not None and _panel_cache[0] == key:
+        console.print(_panel_cache[1])
+        _render_recent_events(state)
+        return
     table = Table.grid(expand=False)
     table.add_column(justify="right", style="cyan", no_wrap=True)
     table.add_column(style="white", overflow="fold")
-    for key, value in state.summary_rows():
-        table.add_row(key, value)
-    console.print(Panel(table, title="AGIROS 工具菜单", box=box.ROUNDED))
+    for label, value in rows:
+        table.add_row(label, value)
+    panel = Panel(table, title="AGIROS 工具菜单", box=box.ROUNDED)
+    _panel_cache = (key, panel)
+    console.print(panel)
+    _render_recent_events(state)
+
+
+def _render_recent_events(state: MenuState) -> None:
+    if not state._log_ring:
+        return
+    recent = "\n".join(f"[{ts}] {msg}" for ts, msg in list(state._log_ring)[-10:])
+    console.print(Panel(Text(recent, style="white"), title="最近构建事件", box=box.ROUNDED))
 
 
 def ensure_directory(path: Path) -> None:
-    if not path.exists():
-        path.mkdir(parents=True, exist_ok=True)
+    # mkdir 本身幂等，直接调用比先 exists() 再建少一次 stat
+    path.mkdir(parents=True, exist_ok=True)
 
 
 def handle_download_release(state: MenuState) -> None:
@@ -551,7 +832,7 @@ def handle_download_release(state: MenuState) -> None:
     if not target:
         console.print("[yellow]已取消：缺少目录[/]")
         return
-    target_path = Path(target).expanduser().resolve()
+    target_path = _resolve(target)
     ensure_directory(target_path)
 
     console.print(Panel(Text("开始下载 Release 仓库", style="bold"), subtitle=str(target_path), box=box.ROUNDED))
@@ -577,8 +858,8 @@ def handle_tracks_download(state: MenuState) -> None:
     resume = ask_confirm("启用断点续传 (resume)?", default=True)
     limit_raw = ask_text("限制下载包数量 (留空则全部下载)", "")
     args = [
-        f"--release-dir={Path(release_dir).expanduser().resolve()}",
-        f"--code-dir={Path(code_dir).expanduser().resolve()}",
+        f"--release-dir={_resolve(release_dir)}",
+        f"--code-dir={_resolve(code_dir)}",
         f"--distro={distro}",
     ]
     if resume:
@@ -598,30 +879,93 @@ def handle_tracks_download(state: MenuState) -> None:
     if exit_code != 0:
         console.print(f"[bold red]处理失败，退出码 {exit_code}[/]")
         return
-    state.release_dir = Path(release_dir).expanduser().resolve()
-    state.code_dir = Path(code_dir).expanduser().resolve()
+    state.release_dir = _resolve(release_dir)
+    state.code_dir = _resolve(code_dir)
     state.tracks_distro = distro
     state.update_env()
 
 
+# list_code_packages 结果缓存：code_dir -> (顶层目录 mtime_ns, 包列表)。
+# 每次菜单跳转都会重扫源码目录，几百个包意味着上万次 stat；顶层 mtime
+# 未变时直接复用上次结果（增删包会改变顶层目录 mtime）。
+_pkg_cache: Dict[Path, Tuple[int, List[Path]]] = {}
+# 跨进程的同款缓存：包列表连同顶层 mtime 落到 ~/.cache/agiros_tools，
+# 冷启动时顶层未变即可免整树扫描；AGIROS_PKG_CACHE=0 同样旁路。
+_PKG_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))) / "agiros_tools"
+
+
+def _pkg_disk_cache_path(code_dir: Path) -> Path:
+    digest = hashlib.blake2b(str(code_dir).encode("utf-8"), digest_size=8).hexdigest()
+    return _PKG_CACHE_DIR / f"packages-{digest}.json"
+
+
+def _load_pkg_disk_cache(code_dir: Path, top_mtime: int) -> Optional[List[Path]]:
+    try:
+        raw = json.loads(_pkg_disk_cache_path(code_dir).read_bytes())
+        if raw.get("mtime_ns") == top_mtime:
+            return [Path(p) for p in raw.get("paths", [])]
+    except Exception:
+        pass
+    return None
+
+
+def _store_pkg_disk_cache(code_dir: Path, top_mtime: int, result: List[Path]) -> None:
+    try:
+        _PKG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps({"mtime_ns": top_mtime, "paths": [str(p) for p in result]})
+        MenuState._atomic_write(_pkg_disk_cache_path(code_dir), payload.encode("utf-8"))
+    except OSError:
+        pass
+
+
 def list_code_packages(code_dir: Path) -> List[Path]:
-    if not code_dir.exists():
+    try:
+        top_mtime = code_dir.stat().st_mtime_ns
+    except OSError:
         return []
-
+    # AGIROS_PKG_CACHE=0 可旁路缓存（顶层 mtime 捕捉不到深层增删时的逃生口）
+    use_cache = os.environ.get("AGIROS_PKG_CACHE", "1") != "0"
+    if use_cache:
+        cached = _pkg_cache.get(code_dir)
+        if cached is not None and cached[0] == top_mtime:
+            return list(cached[1])
+        disk = _load_pkg_disk_cache(code_dir, top_mtime)
+        if disk is not None:
+            _pkg_cache[code_dir] = (top_mtime, disk)
+            return list(disk)
+
+    # 显式 os.scandir 遍历：一次目录扫描同时拿到 package.xml 与子目录
+    # （DirEntry 自带类型信息，免去 os.walk 的额外 stat 与 relative_to 计算），
+    # 命中 package.xml 即停止下探，深度 >2 不再展开。
     depth_limited_packages: List[Path] = []
-    for root, dirs, files in os.walk(code_dir):
-        rel_parts = Path(root).relative_to(code_dir).parts
-        if len(rel_parts) > 2:
-            dirs[:] = []
+    stack: List[Tuple[str, int]] = [(str(code_dir), 0)]
+    while stack:
+        current, depth = stack.pop()
+        children: List[str] = []
+        has_pkg_xml = False
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.name == "package.xml" and entry.is_file():
+                        has_pkg_xml = True
+                    elif entry.is_dir(follow_symlinks=False):
+                        children.append(entry.path)
+        except OSError:
+            continue
+        if has_pkg_xml:
+            depth_limited_packages.append(Path(current))
             continue
-        if "package.xml" in files:
-            depth_limited_packages.append(Path(root))
-            dirs[:] = []
+        if depth < 2:
+            stack.extend((child, depth + 1) for child in children)
 
     if depth_limited_packages:
-        return sorted(set(depth_limited_packages), key=lambda p: str(p))
-
-    return [p for p in sorted(code_dir.iterdir()) if p.is_dir()]
+        result = sorted(set(depth_limited_packages), key=lambda p: str(p))
+    else:
+        result = [p for p in sorted(code_dir.iterdir()) if p.is_dir()]
+    _pkg_cache[code_dir] = (top_mtime, result)
+    if use_cache:
+        _store_pkg_disk_cache(code_dir, top_mtime, result)
+    return list(result)
 
 
 def detect_linux_distribution() -> Optional[str]:
@@ -654,11 +998,16 @@ def prompt_package_path(state: MenuState) -> Optional[Path]:
     if not packages:
         console.print("[yellow]未在源码目录中发现包，建议手动输入路径。[/]")
 
-    def _resolve_package(choice_name: str) -> Optional[Path]:
-        for pkg in packages:
-            if to_display_name(state, pkg) == choice_name:
-                return pkg
-        return None
+    # 显示名只算一次：显示名 -> 路径 的索引用于选中后的解析，
+    # 预先小写的键列表用于关键字扫描（避免每次比较都 .lower()）。
+    displays: Dict[str, Path] = {to_display_name(state, pkg): pkg for pkg in packages}
+    # 关键字匹配索引：所有小写显示名拼成一个换行分隔的大串，查询时
+    # 用一次 re.findall 让 C 层正则引擎整体扫描，替代逐名 Python 级
+    # `in` 比较；小写名 -> 原名按列表聚合，避免大小写折叠后的碰撞丢名。
+    lower_to_names: Dict[str, List[str]] = {}
+    for name in displays:
+        lower_to_names.setdefault(name.lower(), []).append(name)
+    displays_blob = "\n".join(lower_to_names)
 
     while True:
         choice = ask_select("选择源码包目录", ["关键字查询", "手动输入", "返回"])
@@ -668,47 +1017,50 @@ def prompt_package_path(state: MenuState) -> Optional[Path]:
             custom = ask_text("请输入源码包路径", "")
             if not custom:
                 continue
-            return Path(custom).expanduser().resolve()
+            return _resolve(custom)
         if choice == "关键字查询":
             keyword = ask_text("请输入匹配关键字", "")
             if not keyword:
                 console.print("[yellow]未输入关键字。[/]")
                 continue
-            keyword_lower = keyword.lower()
-            matches: List[Tuple[str, Path]] = []
-            for pkg in packages:
-                display = to_display_name(state, pkg)
-                if keyword_lower in display.lower():
-                    matches.append((display, pkg))
+            pattern = re.compile(r"^.*%s.*$" % re.escape(keyword.lower()), re.M)
+            matches = [name for line in pattern.findall(displays_blob) for name in lower_to_names[line]]
             if not matches:
                 console.print(f"[yellow]未找到匹配 \"{keyword}\" 的源码包。[/]")
                 continue
-            display_choices = [name for name, _ in matches] + ["重新搜索", "返回"]
+            display_choices = matches + ["重新搜索", "返回"]
             selection = ask_select("匹配的源码包", display_choices)
             if selection in (None, "返回"):
                 continue
             if selection == "重新搜索":
                 continue
-            pkg_path = _resolve_package(selection)
+            pkg_path = displays.get(selection)
             if pkg_path:
                 return pkg_path
             console.print("[red]选择的包无法解析，请重试。[/]")
 
 
-def build_bloom_command(state: MenuState, kind: str) -> List[str]:
-    base = shlex_split(state.bloom_bin)
+@lru_cache(maxsize=8)
+def _build_bloom_command_cached(bloom_bin: str, kind: str) -> Tuple[str, ...]:
+    base = shlex_split(bloom_bin)
     if not base:
         base = ["bloom-generate"]
     text = " ".join(base)
     if "generate_cmd" in text or text.endswith("agirosdebian") or text.endswith("agirosrpm"):
-        return base
+        return tuple(base)
     if kind == "debian":
-        return base + ["agirosdebian"]
-    return base + ["agirosrpm"]
+        return tuple(base) + ("agirosdebian",)
+    return tuple(base) + ("agirosrpm",)
 
 
-def run_single_bloom(state: MenuState, kind: str, package_path: Path, generate_gbp: bool = False) -> None:
-    ensure_directory(package_path)
+def build_bloom_command(state: MenuState, kind: str) -> List[str]:
+    # 批量模式下每包都要组装一次命令；按 (bloom_bin, kind) 记忆化，
+    # 返回新 list 避免调用方 append 污染缓存。
+    return list(_build_bloom_command_cached(state.bloom_bin, kind))
+
+
+def build_single_bloom_command(state: MenuState, kind: str, package_path: Path, generate_gbp: bool = False) -> Tuple[List[str], Mapping[str, str]]:
+    """组装单包 bloom 命令与环境变量（run_single_bloom 与批量路径共用）。"""
     cmd = build_bloom_command(state, "debian" if kind in {"debian", "gbp"} else "rpm")
     if "agirosdebian" not in cmd and kind in {"debian", "gbp"} and "generate_cmd" not in " ".join(cmd):
         cmd.append("agirosdebian")
@@ -723,55 +1075,160 @@ def run_single_bloom(state: MenuState, kind: str, package_path: Path, generate_g
             cmd += ["--pkg", package_path.name]
     else:
         cmd += ["--ros-distro", state.ros_distro, "--os-name", "openeuler", "--os-version", state.openeuler_default]
-    env = os.environ.copy()
+    # Popen 接受任意 mapping：gbp 模式用 ChainMap 叠加 3 个键，
+    # 其余直接传 os.environ，免去每包一次 100+ 项的字典拷贝。
+    env: Mapping[str, str] = os.environ
     if generate_gbp:
-        env["OOB_TRACKS_DIR"] = str(state.release_dir)
-        env["OOB_TRACKS_DISTRO"] = state.tracks_distro
-        env["AGIROS_DISTRO"] = state.ros_distro
+        env = ChainMap(
+            {
+                "OOB_TRACKS_DIR": str(state.release_dir),
+                "OOB_TRACKS_DISTRO": state.tracks_distro,
+                "AGIROS_DISTRO": state.ros_distro,
+            },
+            os.environ,
+        )
+    return cmd, env
+
+
+def run_single_bloom(state: MenuState, kind: str, package_path: Path, generate_gbp: bool = False) -> None:
+    ensure_directory(package_path)
+    cmd, env = build_single_bloom_command(state, kind, package_path, generate_gbp)
     rc = run_stream(cmd, cwd=package_path, env=env)
     if rc == 0:
         console.print("[green]完成[/]")
 
 
+def _batch_bloom_worker(display_name: str, cmd: List[str], cwd: str, env_overrides: Optional[Dict[str, str]]) -> Tuple[str, int, str]:
+    """子进程任务：执行单条 bloom 命令并捕获输出。
+
+    只传增量环境键（os.environ 不可 pickle），在子进程侧叠加；
+    输出整体带回父进程后一次性打印，避免多进程交叉写终端。
+    """
+    env = ChainMap(env_overrides, os.environ) if env_overrides else None
+    proc = subprocess.run(
+        cmd,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    return display_name, proc.returncode, proc.stdout or ""
+
+
+def _batch_worker_loop(task_queue: "multiprocessing.Queue", result_queue: "multiprocessing.Queue") -> None:
+    """消费者进程：从共享队列取任务直到哨兵（None），空闲即取下一个。
+
+    相比一次性 submit 全部任务，有界工作池在任务耗时差异大时
+    （bloom+dpkg-buildpackage 很常见）能保持核满载且不超订。
+    """
+    while True:
+        job = task_queue.get()
+        if job is None:
+            break
+        display_name, cmd, cwd, env = job
+        try:
+            result = _batch_bloom_worker(display_name, cmd, cwd, env)
+        except Exception as exc:  # 异常也要回报，父进程按失败计
+            result = (display_name, -1, f"执行异常: {exc}")
+        result_queue.put(result)
+
+
+def _batch_mode_kinds(state: MenuState, mode: str) -> List[Tuple[str, bool]]:
+    """mode -> [(kind, generate_gbp)]，与 bloom_menu 的单包分支保持一致。"""
+    gbp = state.auto_generate_gbp
+    if mode == "debian":
+        return [("debian", gbp)]
+    if mode == "spec":
+        return [("rpm", False)]
+    if mode == "both":
+        return [("debian", gbp), ("rpm", False)]
+    return [("gbp", True)]
+
+
+def _run_batch_parallel(state: MenuState, mode: str, packages: List[Path], dry_run: bool = False) -> None:
+    """按包并行分发 bloom 命令；并行度取 state.deb_parallel。
+
+    每个包是独立的 I/O+子进程任务，互不依赖，按核数扇出可线性缩短总墙钟。
+    """
+    jobs: List[Tuple[str, List[str], str, Optional[Dict[str, str]]]] = []
+    for pkg in packages:
+        for kind, generate_gbp in _batch_mode_kinds(state, mode):
+            cmd, env = build_single_bloom_command(state, kind, pkg, generate_gbp)
+            overrides = dict(env.maps[0]) if isinstance(env, ChainMap) else None
+            jobs.append((f"{pkg.name} ({kind})", cmd, str(pkg), overrides))
+
+    if dry_run:
+        for display_name, cmd, cwd, _env in jobs:
+            console.print(f"[dim][dry-run][/] {display_name}: {' '.join(shlex.quote(str(x)) for x in cmd)} (cwd={cwd})")
+        return
+
+    try:
+        workers = max(1, int(state.deb_parallel))
+    except ValueError:
+        workers = os.cpu_count() or 4
+    workers = min(workers, len(jobs)) or 1
+    console.print(f"[cyan]并行处理 {len(packages)} 个包（{workers} 进程，迭代取任务）...[/]")
+    task_queue: "multiprocessing.Queue" = multiprocessing.Queue()
+    result_queue: "multiprocessing.Queue" = multiprocessing.Queue()
+    for job in jobs:
+        task_queue.put(job)
+    for _ in range(workers):
+        task_queue.put(None)  # 每个 worker 一个哨兵
+    procs = [
+        multiprocessing.Process(target=_batch_worker_loop, args=(task_queue, result_queue), daemon=True)
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    failed: List[str] = []
+    done = 0
+    while done < len(jobs):
+        try:
+            # 带超时轮询：worker 被 OOM kill / 工具链段错误整个进程挂掉
+            # 时不会回报任何结果，裸 get() 会在这里永久阻塞
+            name, rc, output = result_queue.get(timeout=5)
+        except queue.Empty:
+            if any(proc.is_alive() for proc in procs):
+                continue
+            remaining = len(jobs) - done
+            console.print(
+                f"[bold red]工作进程已全部退出，仍有 {remaining} 个任务未回报结果，"
+                f"按失败处理（疑似 OOM/崩溃，可查看系统日志）[/]")
+            failed.append(f"<{remaining} 个任务无结果>")
+            break
+        done += 1
+        # 每个任务的输出一次性打印，保持原子性
+        if output.strip():
+            plain_console.print(output.rstrip())
+        if rc == 0:
+            console.print(f"[green]{name} 完成[/]")
+        else:
+            console.print(f"[bold red]{name} 失败，退出码 {rc}[/]")
+            failed.append(name)
+    for proc in procs:
+        proc.join()
+    if failed:
+        console.print(f"[yellow]{len(failed)} 个任务失败：{', '.join(failed)}[/]")
+    else:
+        console.print("[green]批量处理全部完成[/]")
+
+
 def run_batch_bloom(state: MenuState, mode: str) -> None:
-    script = REPO_ROOT / "agiros_oob_builder_procedural.py"
-    if not script.exists():
-        console.print(f"[bold red]未找到 {script}[/]")
+    state.flush_queue()  # 进入批量前确保队列已落盘
+    packages = list_code_packages(state.code_dir)
+    if not packages:
+        console.print(f"[yellow]源码目录未找到任何包: {state.code_dir}[/]")
         return
     limit_raw = ask_text("限制处理包数量 (留空=全部)", "")
     dry_run = ask_confirm("启用 dry-run?", default=False)
-    cmd: List[str] = [
-        sys.executable,
-        str(script),
-        "--release-dir",
-        str(state.release_dir),
-        "--code-dir",
-        str(state.code_dir),
-        "--ros-distro",
-        state.ros_distro,
-        "--ubuntu-default",
-        state.ubuntu_version,
-        "--openeuler-default",
-        state.openeuler_default,
-        "--mode",
-        mode,
-    ]
-    if state.openeuler_fallback:
-        cmd.append("--openeuler-fallback")
-        cmd.extend(state.openeuler_fallback)
-    cmd.extend(["--bloom-bin", state.bloom_bin])
     if limit_raw:
         try:
-            int(limit_raw)
+            packages = packages[: int(limit_raw)]
         except ValueError:
             console.print("[yellow]limit 必须是数字，忽略该参数[/]")
-        else:
-            cmd.extend(["--limit", limit_raw])
-    if dry_run:
-        cmd.append("--dry-run")
-    if mode != "gbp" and state.auto_generate_gbp:
-        cmd.append("--generate-gbp")
-    run_stream(cmd, cwd=REPO_ROOT, env=os.environ.copy())
+    _run_batch_parallel(state, mode, packages, dry_run=dry_run)
 
 
 def bloom_menu(state: MenuState) -> None:
@@ -798,10 +1255,13 @@ def bloom_menu(state: MenuState) -> None:
             elif choice == "生成 debian+spec":
                 run_single_bloom(state, "debian", pkg_path, generate_gbp)
                 run_single_bloom(state, "rpm", pkg_path)
+                pending: List[BuildTask] = []
                 if ask_confirm("将 Debian 构建加入队列?", default=False):
-                    state.append_task_to_queue(BuildTask(pkg_path.name, pkg_path, "debian"))
+                    pending.append(BuildTask(pkg_path.name, pkg_path, "debian"))
                 if ask_confirm("将 RPM 构建加入队列?", default=False):
-                    state.append_task_to_queue(BuildTask(pkg_path.name, pkg_path, "rpm"))
+                    pending.append(BuildTask(pkg_path.name, pkg_path, "rpm"))
+                if pending:
+                    state.append_tasks_to_queue(pending)
             else:
                 run_single_bloom(state, "gbp", pkg_path, True)
                 if ask_confirm("将 Debian 构建加入队列?", default=False):
@@ -817,25 +1277,27 @@ def bloom_menu(state: MenuState) -> None:
 
 
 def describe_build_task(task: BuildTask, state: MenuState) -> str:
-    alias = state.code_label
-    pretty_path = f"{alias}/{task.display_name}"
-    return f"{task.display_name} ({task.kind}) - {pretty_path}"
+    return f"{task._desc} - {state._label_prefix}{task.display_name}"
 
 
 def run_debian_build(state: MenuState, path: Path, extra_args: Optional[List[str]] = None) -> int:
-    script = REPO_ROOT / "git_build_any.sh"
-    env = os.environ.copy()
-    if script.exists():
-        env.setdefault("WORK_DIR", str(path))
-        env.setdefault("CODE_DIR", str(state.code_dir))
-        env.setdefault("DEB_OUT", str(state.deb_out_dir))
-        env.setdefault("DISTRO", state.deb_distro)
-        env.setdefault("DEFAULT_REL_INC", state.deb_release_inc)
-        env.setdefault("PARALLEL", state.deb_parallel)
-        env.setdefault("GIT_USER_NAME", state.git_user_name)
-        env.setdefault("GIT_USER_EMAIL", state.git_user_email)
+    argv = _script_argv("git_build_any.sh")
+    if argv is not None:
+        # 基于模板一次构造；显式赋值同时修掉 setdefault 让外部残留
+        # 环境变量遮蔽菜单配置的问题。
+        env = {
+            **state._env_template,
+            "WORK_DIR": str(path),
+            "CODE_DIR": str(state.code_dir),
+            "DEB_OUT": str(state.deb_out_dir),
+            "DISTRO": state.deb_distro,
+            "DEFAULT_REL_INC": state.deb_release_inc,
+            "PARALLEL": state.deb_parallel,
+            "GIT_USER_NAME": state.git_user_name,
+            "GIT_USER_EMAIL": state.git_user_email,
+        }
         while True:
-            rc = run_stream(["bash", str(script)], cwd=path, env=env)
+            rc = run_stream(list(argv), cwd=path, env=env)
             if rc == 0:
                 return 0
 
@@ -847,24 +1309,39 @@ def run_debian_build(state: MenuState, path: Path, extra_args: Optional[List[str
             if not user_cmd:
                 console.print("[yellow]未输入命令，继续尝试构建。[/]")
                 continue
-            run_stream(["bash", "-lc", user_cmd], cwd=path, env=env)
+            run_stream(["bash", "-c", user_cmd], cwd=path, env=env)
         # unreachable
 
     cmd = ["gbp", "buildpackage"] + state.debian_build_args
     if extra_args:
         cmd += extra_args
-    env = os.environ.copy()
-    return run_stream(cmd, cwd=path, env=env)
+    return run_stream(cmd, cwd=path, env=dict(state._env_template))
+
+
+def _iter_specs(rpm_dir: Path) -> List[Path]:
+    """rpm/*.spec 枚举：一次 scandir 按后缀过滤，省掉 glob 的模式匹配
+    与 exists() 的额外 stat；目录不存在时返回空列表。"""
+    try:
+        with os.scandir(rpm_dir) as it:
+            return sorted(
+                (Path(entry.path) for entry in it
+                 if entry.name.endswith(".spec") and entry.is_file()),
+                key=lambda p: p.name,
+            )
+    except (FileNotFoundError, NotADirectoryError):
+        return []
 
 
 def run_rpm_build(state: MenuState, path: Path, extra_args: Optional[List[str]] = None) -> int:
-    script = REPO_ROOT / "rpmbuild_any.sh"
-    env = os.environ.copy()
-    if script.exists():
-        env.setdefault("WORK_DIR", str(path))
-        env.setdefault("CODE_DIR", str(state.code_dir))
+    argv = _script_argv("rpmbuild_any.sh")
+    if argv is not None:
+        env = {
+            **state._env_template,
+            "WORK_DIR": str(path),
+            "CODE_DIR": str(state.code_dir),
+        }
         while True:
-            rc = run_stream(["bash", str(script)], cwd=path, env=env)
+            rc = run_stream(list(argv), cwd=path, env=env)
             if rc == 0:
                 return 0
 
@@ -876,27 +1353,255 @@ def run_rpm_build(state: MenuState, path: Path, extra_args: Optional[List[str]]
             if not user_cmd:
                 console.print("[yellow]未输入命令，继续尝试构建。[/]")
                 continue
-            run_stream(["bash", "-lc", user_cmd], cwd=path, env=env)
+            run_stream(["bash", "-c", user_cmd], cwd=path, env=env)
         # unreachable
 
     rpm_dir = path / "rpm"
-    specs = sorted(rpm_dir.glob("*.spec")) if rpm_dir.exists() else []
+    specs = _iter_specs(rpm_dir)
     if not specs:
         console.print(f"[yellow]{path} 未找到 rpm/*.spec[/]")
         return 1
     rc = 0
+    extra = tuple(extra_args or ())
+    env = dict(state._env_template)
     for spec in specs:
-        cmd = [state.rpm_build_base] + state.rpm_build_args + [str(spec)]
-        if extra_args:
-            cmd += extra_args
-        rc = run_stream(cmd, cwd=path, env=os.environ.copy())
+        rc = run_stream([*state._rpm_base_argv, str(spec), *extra], cwd=path, env=env)
         if rc != 0:
             break
     return rc
 
 
+def compute_tree_hash(path: Path) -> str:
+    """包目录指纹：git 仓库按索引枚举文件，否则整树 scandir（跳过 .git），
+
+    以排序后的 (相对路径, mtime_ns, size) 喂 blake2b —— 与 done 清单
+    同样把 stat 当内容代理，不读文件内容。
+    """
+    base = str(path)
+    files: List[str] = []
+    if os.path.isdir(os.path.join(base, ".git")):
+        try:
+            out = subprocess.run(
+                ["git", "-C", base, "ls-files", "-z"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            ).stdout
+            files = [item.decode("utf-8", "replace") for item in out.split(b"\0") if item]
+        except Exception:
+            files = []
+    if not files:
+        stack = [base]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.name == ".git":
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append(os.path.relpath(entry.path, base))
+            except OSError:
+                continue
+    digest = hashlib.blake2b(digest_size=16)
+    for rel in sorted(files):
+        try:
+            st = os.stat(os.path.join(base, rel))
+        except OSError:
+            continue
+        digest.update(rel.encode("utf-8", "replace"))
+        digest.update(b"%d:%d;" % (st.st_mtime_ns, st.st_size))
+    return digest.hexdigest()
+
+
+# 构建结果缓存：digest -> 上次成功构建的信息，存放在 release_dir/.build_cache.json。
+# digest 覆盖源码树 + 构建相关配置，命中即跳过整个构建。
+_build_cache: Optional[Dict[str, Any]] = None
+
+
+def _build_cache_path(state: MenuState) -> Path:
+    return state.release_dir / ".build_cache.json"
+
+
+def _load_build_cache(state: MenuState) -> Dict[str, Any]:
+    global _build_cache
+    if _build_cache is None:
+        try:
+            loaded = json.loads(_build_cache_path(state).read_text(encoding="utf-8"))
+            _build_cache = loaded if isinstance(loaded, dict) else {}
+        except Exception:
+            _build_cache = {}
+    return _build_cache
+
+
+def _store_build_cache(state: MenuState, digest: str, task: BuildTask,
+                       artifacts: Sequence[str]) -> None:
+    cache = _load_build_cache(state)
+    cache[digest] = {
+        "package": task.display_name,
+        "kind": task.kind,
+        "time": time.time(),
+        "artifacts": list(artifacts),
+    }
+    try:
+        payload = json.dumps(cache, ensure_ascii=False, indent=2).encode("utf-8")
+        MenuState._atomic_write(_build_cache_path(state), payload)
+    except OSError:
+        pass  # 缓存写失败不影响构建结果
+
+
+def _artifact_roots(state: MenuState, task: BuildTask) -> List[Path]:
+    """某类构建可能落产物的输出目录。"""
+    if task.kind == "debian":
+        return [state.deb_out_dir]
+    if task.kind == "rpm":
+        # rpmbuild 默认 %_topdir；自定义 _topdir 的产物不在这里，
+        # 对应条目会因 artifacts 为空而不参与缓存命中
+        return [Path.home() / "rpmbuild" / "RPMS"]
+    return []
+
+
+def _collect_artifacts(state: MenuState, task: BuildTask, started: float) -> List[str]:
+    """收集本次构建开始之后在输出目录新出现/更新的文件路径。"""
+    found: List[str] = []
+    for root in _artifact_roots(state, task):
+        for dirpath, _dirnames, filenames in os.walk(root):
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                try:
+                    # 留 1s 余量容忍文件系统 mtime 粒度
+                    if os.stat(full).st_mtime >= started - 1:
+                        found.append(full)
+                except OSError:
+                    continue
+    return sorted(found)
+
+
+def _build_cache_hit(state: MenuState, digest: Optional[str]) -> bool:
+    """digest 命中且记录的产物仍在盘上才算缓存有效。
+
+    AGIROS_BUILD_CACHE=0 可整体旁路强制重建；旧格式/未记录到产物的
+    条目无法校验，一律按未命中处理。
+    """
+    if digest is None or os.environ.get("AGIROS_BUILD_CACHE", "1") == "0":
+        return False
+    entry = _load_build_cache(state).get(digest)
+    if not isinstance(entry, dict):
+        return False
+    artifacts = entry.get("artifacts")
+    if not artifacts:
+        return False
+    return all(os.path.exists(p) for p in artifacts)
+
+
+def _task_digest(state: MenuState, task: BuildTask) -> Optional[str]:
+    try:
+        tree = compute_tree_hash(task.path)
+    except OSError:
+        return None
+    env_inputs = {
+        "kind": task.kind,
+        "distro": state.deb_distro,
+        "release_inc": state.deb_release_inc,
+        "parallel": state.deb_parallel,
+        "debian_args": state.debian_build_args if task.kind == "debian" else [],
+        "rpm_cmd": [state.rpm_build_base, *state.rpm_build_args] if task.kind == "rpm" else [],
+        "extra": list(task.extra_args),
+    }
+    digest = hashlib.blake2b(tree.encode("ascii"), digest_size=16)
+    digest.update(json.dumps(env_inputs, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _run_build_quiet(cmd: Sequence[str], cwd: Path, env: Optional[Mapping[str, str]]) -> Tuple[int, str]:
+    """非交互构建：捕获输出整体返回，供并行队列在主线程统一打印。"""
+    proc = subprocess.run(
+        list(map(str, cmd)),
+        cwd=str(cwd),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    return proc.returncode, proc.stdout or ""
+
+
+def _build_task_quiet(state: MenuState, task: BuildTask) -> Tuple[int, str]:
+    """execute_build 的无提示变体：失败直接返回，不进入重试交互。"""
+    path = task.path
+    if task.kind == "debian":
+        argv = _script_argv("git_build_any.sh")
+        if argv is not None:
+            env = {
+                **state._env_template,
+                "WORK_DIR": str(path),
+                "CODE_DIR": str(state.code_dir),
+                "DEB_OUT": str(state.deb_out_dir),
+                "DISTRO": state.deb_distro,
+                "DEFAULT_REL_INC": state.deb_release_inc,
+                "PARALLEL": state.deb_parallel,
+                "GIT_USER_NAME": state.git_user_name,
+                "GIT_USER_EMAIL": state.git_user_email,
+            }
+            return _run_build_quiet(list(argv), path, env)
+        cmd = ["gbp", "buildpackage"] + state.debian_build_args + list(task.extra_args or [])
+        return _run_build_quiet(cmd, path, None)
+    if task.kind == "rpm":
+        argv = _script_argv("rpmbuild_any.sh")
+        if argv is not None:
+            env = {
+                **state._env_template,
+                "WORK_DIR": str(path),
+                "CODE_DIR": str(state.code_dir),
+            }
+            return _run_build_quiet(list(argv), path, env)
+        rpm_dir = path / "rpm"
+        specs = _iter_specs(rpm_dir)
+        if not specs:
+            return 1, f"{path} 未找到 rpm/*.spec"
+        chunks: List[str] = []
+        extra = tuple(task.extra_args or ())
+        for spec in specs:
+            cmd = [*state._rpm_base_argv, str(spec), *extra]
+            rc, out = _run_build_quiet(cmd, path, None)
+            if out.strip():
+                chunks.append(out.rstrip())
+            if rc != 0:
+                return rc, "\n".join(chunks)
+        return 0, "\n".join(chunks)
+    return 1, f"未知的构建类型: {task.kind}"
+
+
+def _build_one(state: MenuState, pkg: str, tasks: Sequence[BuildTask]) -> Tuple[str, bool, str]:
+    """依序跑完一个包的全部构建任务；首个失败即停。"""
+    chunks: List[str] = []
+    for task in tasks:
+        digest = _task_digest(state, task)
+        if _build_cache_hit(state, digest):
+            chunks.append(f"--- {describe_build_task(task, state)} --- 命中构建缓存（产物仍在），跳过")
+            continue
+        started = time.time()
+        rc, out = _build_task_quiet(state, task)
+        if out.strip():
+            chunks.append(f"--- {describe_build_task(task, state)} ---\n{out.rstrip()}")
+        if rc != 0:
+            return pkg, False, "\n".join(chunks)
+        if digest is not None:
+            _store_build_cache(state, digest, task,
+                               _collect_artifacts(state, task, started))
+    return pkg, True, "\n".join(chunks)
+
+
 def execute_build(task: BuildTask, state: MenuState) -> bool:
     console.print(Panel(f"开始构建: {describe_build_task(task, state)}", box=box.ROUNDED))
+    digest = _task_digest(state, task)
+    if _build_cache_hit(state, digest):
+        console.print("[green]命中构建缓存（源码与构建参数未变化，产物仍在输出目录），跳过[/]")
+        return True
+    started = time.time()
     success = True
     if task.kind == "debian":
         if run_debian_build(state, task.path, task.extra_args) != 0:
@@ -907,22 +1612,67 @@ def execute_build(task: BuildTask, state: MenuState) -> bool:
     else:
         console.print(f"[red]未知的构建类型: {task.kind}[/]")
         success = False
+    if success and digest is not None:
+        _store_build_cache(state, digest, task,
+                           _collect_artifacts(state, task, started))
     console.print("[green]构建完成[/]" if success else "[red]构建失败[/]")
     return success
 
 
+def _parse_package_meta(path: Path) -> Tuple[Optional[str], frozenset]:
+    """读 package.xml 的 <name> 与 depend 系标签；缺失或解析失败视为无依赖。"""
+    xml_path = path / "package.xml"
+    try:
+        from xml.etree import ElementTree
+        root = ElementTree.parse(xml_path).getroot()
+    except Exception:
+        return None, frozenset()
+    name_node = root.find("name")
+    name = name_node.text.strip() if name_node is not None and name_node.text else None
+    deps = set()
+    for tag in ("depend", "build_depend", "buildtool_depend", "run_depend", "exec_depend"):
+        for node in root.iter(tag):
+            if node.text and node.text.strip():
+                deps.add(node.text.strip())
+    return name, frozenset(deps)
+
+
+def _topo_order(state: MenuState, pending: List[str]) -> List[List[str]]:
+    """按 package.xml 依赖把待执行包分层（Kahn）：只看同在队列中的依赖，
+    被依赖的包排在前面的层；环路时剩余包并作一层，保证总能执行。"""
+    deps_of: Dict[str, frozenset] = {}
+    name_to_pkg: Dict[str, str] = {}
+    for pkg in pending:
+        task = state.tasks_by_pkg[pkg][0]
+        name, deps = _parse_package_meta(task.path)
+        deps_of[pkg] = deps
+        if name:
+            name_to_pkg.setdefault(name, pkg)
+        name_to_pkg.setdefault(pkg, pkg)
+    graph = {
+        pkg: {name_to_pkg[d] for d in deps_of[pkg]
+              if d in name_to_pkg and name_to_pkg[d] != pkg}
+        for pkg in pending
+    }
+    levels: List[List[str]] = []
+    done: set = set()
+    remaining = dict(graph)
+    while remaining:
+        ready = [pkg for pkg, deps in remaining.items() if deps <= done]
+        if not ready:
+            levels.append(list(remaining))
+            break
+        levels.append(ready)
+        done.update(ready)
+        for pkg in ready:
+            del remaining[pkg]
+    return levels
+
+
 def manage_build_queue(state: MenuState) -> None:
     while True:
         state.load_queue_from_file()
-        options = [
-            "查看队列",
-            "添加任务",
-            "执行队列",
-            "清空队列",
-            "编辑构建参数",
-            "返回",
-        ]
-        choice = ask_select("构建菜单", options)
+        choice = ask_select("构建菜单", _QUEUE_MENU)
         if choice in (None, "返回"):
             return
         if choice == "查看队列":
@@ -932,11 +1682,21 @@ def manage_build_queue(state: MenuState) -> None:
                     handle_scan_and_generate(state)
                     state.load_queue_from_file()
                     continue
+            # 整表一次渲染：千包队列从 N 次 console.print 降为 1 次输出
+            table = Table(show_header=True, box=box.MINIMAL)
+            table.add_column("#", justify="right", style="cyan", no_wrap=True)
+            table.add_column("包名", style="white")
+            table.add_column("类型", style="white")
+            table.add_column("完成", justify="center", style="green")
             for idx, pkg in enumerate(state.queue_packages, start=1):
-                kinds = [task.kind for task in state.build_queue if task.display_name == pkg]
-                kinds_text = ", ".join(sorted(set(kinds))) if kinds else "-"
-                mark = " #" if state.package_status.get(pkg) else ""
-                console.print(f"{idx}. {pkg}{mark} ({kinds_text})")
+                kinds = {task.kind for task in state.tasks_by_pkg.get(pkg, ())}
+                table.add_row(
+                    str(idx),
+                    pkg,
+                    ", ".join(sorted(kinds)) if kinds else "-",
+                    "#" if state.package_status.get(pkg) else "",
+                )
+            console.print(table)
             if state.queue_packages and ask_confirm("移除包?", default=False):
                 idx_raw = ask_text("输入要移除的编号", "")
                 if idx_raw and idx_raw.isdigit():
@@ -966,32 +1726,77 @@ def manage_build_queue(state: MenuState) -> None:
             if not state.queue_packages:
                 console.print("[cyan]队列为空[/]")
                 continue
-            pending = [pkg for pkg in state.queue_packages if not state.package_status.get(pkg)]
+            # 一次遍历同时过滤完成标记与无任务的包，后面串/并行分支只走 pending
+            pending = [
+                pkg for pkg in state.queue_packages
+                if not state.package_status.get(pkg) and state.tasks_by_pkg.get(pkg)
+            ]
             if not pending:
                 console.print("[cyan]所有包均已标记完成 (#)，如需重新构建请先移除或重新加入。[/]")
                 continue
+            # 依赖拓扑分层：被依赖的包先构建；并行时按层派发，层内互不依赖
+            levels = _topo_order(state, pending)
+            pending = [pkg for level in levels for pkg in level]
             failed_packages: List[str] = []
             aborted = False
-            for pkg in state.queue_packages:
-                tasks_for_pkg = [task for task in state.build_queue if task.display_name == pkg]
-                if not tasks_for_pkg:
-                    continue
-                if state.package_status.get(pkg):
-                    console.print(f"[cyan]{pkg} 已标记完成，跳过[/]")
-                    continue
+            try:
+                jobs = max(1, int(state.deb_parallel))
+            except ValueError:
+                jobs = 1
+            if jobs > 1 and len(pending) > 1:
+                # 互不依赖的包并行构建（构建是子进程密集型，线程池即可）；
+                # 并行下无法复用交互式重试，失败统一收尾汇报。
+                jobs = min(jobs, len(pending), os.cpu_count() or jobs)
+                console.print(f"[cyan]并行执行队列（{jobs} 个工作线程，失败不中断）...[/]")
+                with ThreadPoolExecutor(max_workers=jobs) as pool:
+                    for level in levels:
+                        futures = {
+                            pool.submit(
+                                _build_one, state, pkg,
+                                list(state.tasks_by_pkg[pkg]),
+                            ): pkg
+                            for pkg in level
+                        }
+                        for future in as_completed(futures):
+                            pkg, ok, output = future.result()
+                            if output:
+                                plain_console.print(output)
+                            # package_status 只在主线程更新；随手标脏，
+                            # 中途崩溃最多丢去抖窗口内的进度
+                            state.package_status[pkg] = ok
+                            state._mark_dirty()
+                            if ok:
+                                # 成功通知入环形缓冲，重绘时汇总；失败必须立即可见
+                                state.log(f"{pkg} 构建完成")
+                            else:
+                                failed_packages.append(pkg)
+                                state.log(f"{pkg} 构建失败")
+                                console.print(f"[red]{pkg} 构建失败[/]")
+                state.save_queue()
+                if failed_packages:
+                    console.print("[yellow]以下包构建失败，已保持未完成状态：[/]")
+                    for pkg in failed_packages:
+                        console.print(f"- {pkg}")
+                else:
+                    console.print("[green]队列包均已成功构建并标记为 #[/]")
+                continue
+            for pkg in pending:
                 package_failed = False
-                for task in tasks_for_pkg:
+                for task in state.tasks_by_pkg[pkg]:
                     if not execute_build(task, state):
                         package_failed = True
                         break
                 if package_failed:
                     failed_packages.append(pkg)
                     state.package_status[pkg] = False
+                    # 每包完成即标脏：写线程去抖落盘，中途崩溃不再丢整轮进度
+                    state._mark_dirty()
                     if not ask_confirm("继续执行剩余包?", default=True):
                         aborted = True
                         break
                 else:
                     state.package_status[pkg] = True
+                    state._mark_dirty()
             state.save_queue()
             if failed_packages:
                 console.print("[yellow]以下包构建失败，已保持未完成状态：[/]")
@@ -1006,35 +1811,50 @@ def manage_build_queue(state: MenuState) -> None:
             edit_build_parameters(state)
 
 
+def _edit_debian_args(state: MenuState) -> None:
+    current = " ".join(state.debian_build_args)
+    new_value = ask_text("请输入 gbp buildpackage 附加参数", current)
+    state.debian_build_args = shlex_split(new_value or "")
+
+
+def _edit_rpm_command(state: MenuState) -> None:
+    base = ask_text("rpmbuild 命令 (可包含路径)", state.rpm_build_base)
+    args = ask_text("rpmbuild 参数", " ".join(state.rpm_build_args))
+    if base:
+        state.rpm_build_base = base
+    state.rpm_build_args = shlex_split(args or "")
+
+
+def _edit_toggle_gbp(state: MenuState) -> None:
+    state.auto_generate_gbp = not state.auto_generate_gbp
+    console.print(f"[cyan]批量操作自动生成 gbp.conf {'已启用' if state.auto_generate_gbp else '已关闭'}[/]")
+
+
+# 菜单标签 -> 处理函数：一次哈希查找替代逐项字符串比较的 if/elif 链
+_EDIT_ACTIONS: Dict[str, Callable[[MenuState], None]] = {
+    "Debian 构建参数": _edit_debian_args,
+    "RPM 构建命令": _edit_rpm_command,
+    "切换自动生成 gbp.conf": _edit_toggle_gbp,
+}
+_EDIT_MENU: Tuple[str, ...] = (*_EDIT_ACTIONS, "返回")
+
+
 def edit_build_parameters(state: MenuState) -> None:
     while True:
-        choice = ask_select("编辑构建参数", ["Debian 构建参数", "RPM 构建命令", "切换自动生成 gbp.conf", "返回"])
+        choice = ask_select("编辑构建参数", _EDIT_MENU)
         if choice in (None, "返回"):
             return
-        if choice == "Debian 构建参数":
-            current = " ".join(state.debian_build_args)
-            new_value = ask_text("请输入 gbp buildpackage 附加参数", current)
-            state.debian_build_args = shlex_split(new_value or "")
-        elif choice == "RPM 构建命令":
-            base = ask_text("rpmbuild 命令 (可包含路径)", state.rpm_build_base)
-            args = ask_text("rpmbuild 参数", " ".join(state.rpm_build_args))
-            if base:
-                state.rpm_build_base = base
-            state.rpm_build_args = shlex_split(args or "")
-        elif choice == "切换自动生成 gbp.conf":
-            state.auto_generate_gbp = not state.auto_generate_gbp
-            console.print(f"[cyan]批量操作自动生成 gbp.conf {'已启用' if state.auto_generate_gbp else '已关闭'}[/]")
+        _EDIT_ACTIONS[choice](state)
         state.update_env()
 
 
 def handle_clean(state: MenuState) -> None:
-    script = REPO_ROOT / "clean_generated.sh"
-    if not script.exists():
-        console.print(f"[red]未找到 {script}[/]")
+    argv = _script_argv("clean_generated.sh")
+    if argv is None:
+        console.print(f"[red]未找到 {REPO_ROOT / 'clean_generated.sh'}[/]")
         return
-    env = os.environ.copy()
-    env["CODE_DIR"] = str(state.code_dir)
-    rc = run_stream(["bash", str(script)], cwd=REPO_ROOT, env=env)
+    env = {**state._env_template, "CODE_DIR": str(state.code_dir)}
+    rc = run_direct(list(argv), cwd=REPO_ROOT, env=env)
     if rc == 0:
         console.print("[green]清理完成[/]")
 
@@ -1090,11 +1910,7 @@ def handle_scan_and_generate(state: MenuState) -> None:
         build_kind = "debian"
         os_label = "Ubuntu"
     else:
-        matched = []
-        for pkg in packages:
-            rpm_dir = pkg / "rpm"
-            if rpm_dir.is_dir() and any(rpm_dir.glob("*.spec")):
-                matched.append(pkg)
+        matched = [pkg for pkg in packages if _iter_specs(pkg / "rpm")]
         build_kind = "rpm"
         os_label = "openEuler"
 
@@ -1115,98 +1931,123 @@ def handle_scan_and_generate(state: MenuState) -> None:
     console.print(f"[dim]构建列表文件: {state.queue_file}[/]")
 
 
+def _config_release_dir(state: MenuState) -> None:
+    value = ask_text("新的 Release 仓库目录", str(state.release_dir))
+    if value:
+        state.release_dir = _resolve(value)
+
+
+def _config_code_dir(state: MenuState) -> None:
+    value = ask_text("新的源码目录", str(state.code_dir))
+    if value:
+        state.code_dir = _resolve(value)
+
+
+def _config_distribution_url(state: MenuState) -> None:
+    value = ask_text("新的 URL", state.distribution_url)
+    if value:
+        state.distribution_url = value
+
+
+def _config_ros_tracks(state: MenuState) -> None:
+    ros = ask_text("ROS 发行版", state.ros_distro)
+    tracks = ask_text("Tracks 发行版", state.tracks_distro)
+    ubuntu = ask_text("Ubuntu 版本", state.ubuntu_version)
+    state.ros_distro = ros or state.ros_distro
+    state.tracks_distro = tracks or state.tracks_distro
+    state.ubuntu_version = ubuntu or state.ubuntu_version
+
+
+def _config_openeuler(state: MenuState) -> None:
+    default = ask_text("openEuler 默认版本", state.openeuler_default)
+    fallback = ask_text("openEuler 回退列表 (逗号分隔)", ", ".join(state.openeuler_fallback))
+    if default:
+        state.openeuler_default = default
+    if fallback is not None:
+        state.openeuler_fallback = [item.strip() for item in fallback.split(",") if item.strip()]
+
+
+def _config_bloom_bin(state: MenuState) -> None:
+    bloom = ask_text("bloom 可执行命令", state.bloom_bin)
+    if bloom:
+        state.bloom_bin = bloom
+
+
+def _config_queue_file(state: MenuState) -> None:
+    value = ask_text("构建队列文件路径", str(state.queue_file))
+    meta_value = ask_text("构建队列元数据文件路径 (留空则使用默认 .meta.json)", str(state.queue_meta_file))
+    if value:
+        state.queue_file = state._normalize_path(value)
+    if meta_value:
+        state.queue_meta_file = state._normalize_path(meta_value)
+    else:
+        state.queue_meta_file = state._meta_path_for_queue(state.queue_file)
+    state.ensure_queue_file()
+    state.load_queue_from_file()
+
+
+def _config_debian_build(state: MenuState) -> None:
+    code_label = ask_text("主界面源码前缀标签", state.code_label)
+    deb_out = ask_text("Debian 输出目录", str(state.deb_out_dir))
+    distro = ask_text("Debian DISTRO (gbp release_tag 用)", state.deb_distro)
+    release_inc = ask_text("默认 release_inc", state.deb_release_inc)
+    parallel = ask_text("并行线程数", state.deb_parallel)
+    git_name = ask_text("Git 提交用户名", state.git_user_name)
+    git_email = ask_text("Git 提交邮箱", state.git_user_email)
+    if code_label:
+        state.code_label = code_label
+    if deb_out:
+        state.deb_out_dir = _resolve(deb_out)
+    if distro:
+        state.deb_distro = distro
+    if release_inc:
+        state.deb_release_inc = release_inc
+    if parallel:
+        state.deb_parallel = parallel
+    if git_name:
+        state.git_user_name = git_name
+    if git_email:
+        state.git_user_email = git_email
+
+
+_CONFIG_ACTIONS: Dict[str, Callable[[MenuState], None]] = {
+    "修改 Release 目录": _config_release_dir,
+    "修改 源码目录": _config_code_dir,
+    "修改 distribution.yaml URL": _config_distribution_url,
+    "修改 ROS/Tracks 配置": _config_ros_tracks,
+    "修改 openEuler 参数": _config_openeuler,
+    "修改 Bloom 命令": _config_bloom_bin,
+    "修改 构建队列文件路径": _config_queue_file,
+    "修改 Debian 构建配置": _config_debian_build,
+}
+_CONFIG_MENU: Tuple[str, ...] = (*_CONFIG_ACTIONS, "返回")
+
+
 def handle_configuration(state: MenuState) -> None:
     while True:
         render_state_panel(state)
-        choice = ask_select(
-            "配置与状态",
-            [
-                "修改 Release 目录",
-                "修改 源码目录",
-                "修改 distribution.yaml URL",
-                "修改 ROS/Tracks 配置",
-                "修改 openEuler 参数",
-                "修改 Bloom 命令",
-                "修改 构建队列文件路径",
-                "修改 Debian 构建配置",
-                "返回",
-            ],
-        )
+        choice = ask_select("配置与状态", _CONFIG_MENU)
         if choice in (None, "返回"):
             return
-        if choice == "修改 Release 目录":
-            value = ask_text("新的 Release 仓库目录", str(state.release_dir))
-            if value:
-                state.release_dir = Path(value).expanduser().resolve()
-        elif choice == "修改 源码目录":
-            value = ask_text("新的源码目录", str(state.code_dir))
-            if value:
-                state.code_dir = Path(value).expanduser().resolve()
-        elif choice == "修改 distribution.yaml URL":
-            value = ask_text("新的 URL", state.distribution_url)
-            if value:
-                state.distribution_url = value
-        elif choice == "修改 ROS/Tracks 配置":
-            ros = ask_text("ROS 发行版", state.ros_distro)
-            tracks = ask_text("Tracks 发行版", state.tracks_distro)
-            ubuntu = ask_text("Ubuntu 版本", state.ubuntu_version)
-            state.ros_distro = ros or state.ros_distro
-            state.tracks_distro = tracks or state.tracks_distro
-            state.ubuntu_version = ubuntu or state.ubuntu_version
-        elif choice == "修改 openEuler 参数":
-            default = ask_text("openEuler 默认版本", state.openeuler_default)
-            fallback = ask_text("openEuler 回退列表 (逗号分隔)", ", ".join(state.openeuler_fallback))
-            if default:
-                state.openeuler_default = default
-            if fallback is not None:
-                state.openeuler_fallback = [item.strip() for item in fallback.split(",") if item.strip()]
-        elif choice == "修改 Bloom 命令":
-            bloom = ask_text("bloom 可执行命令", state.bloom_bin)
-            if bloom:
-                state.bloom_bin = bloom
-        elif choice == "修改 构建队列文件路径":
-            value = ask_text("构建队列文件路径", str(state.queue_file))
-            meta_value = ask_text("构建队列元数据文件路径 (留空则使用默认 .meta.json)", str(state.queue_meta_file))
-            if value:
-                state.queue_file = state._normalize_path(value)
-            if meta_value:
-                state.queue_meta_file = state._normalize_path(meta_value)
-            else:
-                state.queue_meta_file = state._meta_path_for_queue(state.queue_file)
-            state.ensure_queue_file()
-            state.load_queue_from_file()
-        elif choice == "修改 Debian 构建配置":
-            code_label = ask_text("主界面源码前缀标签", state.code_label)
-            deb_out = ask_text("Debian 输出目录", str(state.deb_out_dir))
-            distro = ask_text("Debian DISTRO (gbp release_tag 用)", state.deb_distro)
-            release_inc = ask_text("默认 release_inc", state.deb_release_inc)
-            parallel = ask_text("并行线程数", state.deb_parallel)
-            git_name = ask_text("Git 提交用户名", state.git_user_name)
-            git_email = ask_text("Git 提交邮箱", state.git_user_email)
-            if code_label:
-                state.code_label = code_label
-            if deb_out:
-                state.deb_out_dir = Path(deb_out).expanduser().resolve()
-            if distro:
-                state.deb_distro = distro
-            if release_inc:
-                state.deb_release_inc = release_inc
-            if parallel:
-                state.deb_parallel = parallel
-            if git_name:
-                state.git_user_name = git_name
-            if git_email:
-                state.git_user_email = git_email
+        _CONFIG_ACTIONS[choice](state)
         state.update_env()
 
 
 def gather_log_candidates(state: MenuState) -> List[Path]:
-    candidates = [
-        state.release_dir / "download_log.txt",
-        state.release_dir / "failed_repos.txt",
-        REPO_ROOT / "fail.log",
-    ]
-    return [path for path in candidates if path.exists()]
+    # release_dir 下的候选用一次 readdir 判存在，替代逐个 stat；
+    # 远程挂载（NFS/sshfs）上 3 次往返降为 1 次。
+    names = ("download_log.txt", "failed_repos.txt")
+    candidates: List[Path] = []
+    try:
+        with os.scandir(state.release_dir) as it:
+            present = {entry.name for entry in it}
+    except OSError:
+        present = set()
+    candidates.extend(state.release_dir / name for name in names if name in present)
+    fail_log = REPO_ROOT / "fail.log"
+    if fail_log.exists():
+        candidates.append(fail_log)
+    return candidates
 
 
 def handle_logs(state: MenuState) -> None:
@@ -1225,45 +2066,41 @@ def handle_logs(state: MenuState) -> None:
     if not path.exists():
         console.print(f"[red]未找到 {path}[/]")
         return
-    content = path.read_text(encoding="utf-8", errors="ignore")
+    # 只读尾部：seek 到末尾 8KiB 再读，超大日志不再整文件进内存
+    size = path.stat().st_size
+    with path.open("rb") as handle:
+        if size > 8192:
+            handle.seek(size - 8192)
+        raw = handle.read()
+    content = raw.decode("utf-8", errors="ignore")
+    if size > 8192:
+        # 丢掉可能被截断的首行（含残缺的 UTF-8 序列）
+        content = content.split("\n", 1)[-1]
     console.print(Panel(Text(content if len(content) < 4000 else content[-4000:], style="white"), title=str(path), box=box.ROUNDED))
 
 
+_MAIN_ACTIONS: Dict[str, Callable[[MenuState], None]] = {
+    "下载 release 仓库": handle_download_release,
+    "处理 tracks.yaml / 下载源码": handle_tracks_download,
+    "Bloom 打包": bloom_menu,
+    "构建 (Build)": manage_build_queue,
+    "清理生成目录": handle_clean,
+    "配置与状态": handle_configuration,
+    "查看日志": handle_logs,
+}
+_MAIN_MENU: Tuple[str, ...] = (*_MAIN_ACTIONS, "退出")
+
+
 def main() -> None:
     state = MenuState()
     state.update_env()
     while True:
         render_state_panel(state)
-        choice = ask_select(
-            "请选择操作",
-            [
-                "下载 release 仓库",
-                "处理 tracks.yaml / 下载源码",
-                "Bloom 打包",
-                "构建 (Build)",
-                "清理生成目录",
-                "配置与状态",
-                "查看日志",
-                "退出",
-            ],
-        )
-        if choice == "下载 release 仓库":
-            handle_download_release(state)
-        elif choice == "处理 tracks.yaml / 下载源码":
-            handle_tracks_download(state)
-        elif choice == "Bloom 打包":
-            bloom_menu(state)
-        elif choice == "构建 (Build)":
-            manage_build_queue(state)
-        elif choice == "清理生成目录":
-            handle_clean(state)
-        elif choice == "配置与状态":
-            handle_configuration(state)
-        elif choice == "查看日志":
-            handle_logs(state)
-        elif choice == "退出" or choice is None:
+        choice = ask_select("请选择操作", _MAIN_MENU)
+        if choice in (None, "退出"):
             console.print("[cyan]Bye[/]")
             break
+        _MAIN_ACTIONS[choice](state)
 
 
 if __name__ == "__main__":
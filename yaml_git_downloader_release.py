@@ -1,7 +1,27 @@
+import hashlib
+import json
+from dataclasses import dataclass
 import os
+import random
+import shlex
+import shutil
+import stat
 import subprocess
+import threading
+import time
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter, Retry
 import yaml
+
+# 优先使用 libyaml 的 C 解析器（大 YAML 快一个数量级），缺失则回退纯 Python
+try:
+    from yaml import CSafeLoader as _YamlLoader
+    _HAS_LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+    _HAS_LIBYAML = False
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import datetime
 
@@ -9,6 +29,42 @@ import datetime
 TARGET_DIR = os.environ.get("AGIROS_RELEASE_TARGET_DIR", "ros2_release_dir")
 LOG_FILE = os.path.join(TARGET_DIR, "download_log.txt")
 GIT_CLONE_TIMEOUT = int(os.environ.get("AGIROS_GIT_CLONE_TIMEOUT", "600"))
+# 并行克隆线程数：克隆为网络/子进程密集型，线程池即可充分并行
+DOWNLOAD_JOBS = int(os.environ.get("AGIROS_DOWNLOAD_JOBS", "8"))
+# 单个 git 进程内部的并行度（子模块检出 / fetch.parallel）
+GIT_JOBS = int(os.environ.get("AGIROS_GIT_JOBS", "4"))
+# 浅克隆：构建只需最新快照，不拉全部历史/标签/blob（设 0 可关闭）
+SHALLOW_CLONE = os.environ.get("AGIROS_SHALLOW_CLONE", "1") != "0"
+# 可选的本地对象缓存目录：<缓存>/<仓库名> 存在时 clone 直接借用其对象，
+# 不存在则静默忽略（--reference-if-able 语义），默认关闭
+GIT_REFERENCE_DIR = os.environ.get("AGIROS_GIT_REFERENCE_DIR", "")
+# 同一主机的并发克隆上限：总线程数再高，单个 git 服务器也只吃这么多
+# 连接，避免把托管端打到限速/拒连
+PER_HOST_JOBS = int(os.environ.get("AGIROS_PER_HOST_JOBS", "4"))
+
+_host_semaphores = {}
+_host_sem_lock = threading.Lock()
+
+
+def _host_semaphore(url: str) -> threading.Semaphore:
+    """按 URL 主机名取（必要时创建）对应的并发信号量。"""
+    host = urlparse(url).netloc or "<local>"
+    with _host_sem_lock:
+        sem = _host_semaphores.get(host)
+        if sem is None:
+            sem = _host_semaphores[host] = threading.Semaphore(PER_HOST_JOBS)
+    return sem
+
+# 复用的 HTTP 会话：连接池 + 自动重试（瞬时网络错误退避后再试）
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3,
+                      status_forcelist=(500, 502, 503, 504)),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 # ANSI 颜色定义
 class Color:
@@ -28,7 +84,94 @@ def log_message(message: str, color: str = Color.RESET):
         f.write(formatted + "\n")
 
 
-def safe_git_clone_or_resume(repo_url, repo_path):
+# git 的 HTTP 传输低速熔断：30s 内持续低于 1000B/s 即判定连接死掉，
+# 让卡死的传输尽早失败进入重试，而不是干等整个 timeout
+_GIT_ENV = {**os.environ,
+            "GIT_HTTP_LOW_SPEED_LIMIT": "1000",
+            "GIT_HTTP_LOW_SPEED_TIME": "30"}
+
+
+def _run_git(cmd, attempts: int = 3, timeout: int = GIT_CLONE_TIMEOUT,
+             cleanup_path: str = None):
+    """
+    执行一条 git 命令：统一加超时与低速熔断环境变量，超时/非零退出时
+    指数退避（min(2^n, 30)s + 随机抖动）重试，最多 attempts 次；
+    全部失败抛出最后一次异常。cleanup_path 指定时，重试前先删掉
+    可能残留的半成品目录（clone 被 kill 后不会自清理）。
+    """
+    for attempt in range(attempts):
+        try:
+            return subprocess.run(cmd,
+                                  check=True,
+                                  stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL,
+                                  timeout=timeout,
+                                  env=_GIT_ENV)
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
+            if attempt == attempts - 1:
+                raise
+            if cleanup_path:
+                shutil.rmtree(cleanup_path, ignore_errors=True)
+            time.sleep(min(2 ** attempt, 30) + random.random())
+
+
+@dataclass(frozen=True)
+class RepoTask:
+    """一次下载任务需要的全部输入，派发前一次性构好。"""
+    name: str
+    url: str
+    path: str
+
+
+def _local_head(repo_path):
+    """返回本地 HEAD 的 sha，取不到（空仓库/非 git 目录）返回 None。"""
+    try:
+        return subprocess.run(
+            ["git", "-C", repo_path, "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip() or None
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+def _load_progress(target_dir: str):
+    """读取 .progress.jsonl 断点记录，返回 {仓库名: 最后一条记录}。"""
+    done = {}
+    try:
+        with open(os.path.join(target_dir, ".progress.jsonl")) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    done[rec["name"]] = rec
+                except (ValueError, KeyError, TypeError):
+                    continue  # 中断导致的残行直接忽略
+    except OSError:
+        pass
+    return done
+
+
+def _remote_head_matches(repo_path) -> bool:
+    """
+    用一次轻量 ls-remote 探测远端 HEAD 是否与本地一致。
+    一致时调用方可直接跳过 fetch + reset（整包协商/传输省掉）；
+    任意一步失败都返回 False，回退到正常 fetch 流程。
+    """
+    try:
+        remote = subprocess.run(
+            ["git", "-C", repo_path, "ls-remote", "origin", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=60,
+        ).stdout.split()
+        local = subprocess.run(
+            ["git", "-C", repo_path, "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        return bool(remote) and bool(local) and remote[0] == local
+    except (subprocess.SubprocessError, OSError):
+        return False
+
+
+def safe_git_clone_or_resume(repo_url, repo_path, git_jobs: int = GIT_JOBS,
+                             shallow: bool = SHALLOW_CLONE):
     """
     克隆仓库，如果已存在则尝试 git fetch 断点续传。
     返回 True 表示成功，False 表示失败。
@@ -36,21 +179,48 @@ def safe_git_clone_or_resume(repo_url, repo_path):
     - 仓库路径冲突或不是 Git 仓库
     - 仓库下载失败
     - 已经下载过（跳过）
+    git_jobs 控制单个 git 进程内部并行度（--jobs / fetch.parallel）。
+    shallow=True 时只取最新快照（depth=1、单分支、不拉 blob 历史），
+    更新同样走 depth=1 fetch + FETCH_HEAD，网络量与磁盘占用显著下降。
     """
-    if os.path.exists(repo_path):
-        if os.path.isdir(os.path.join(repo_path, ".git")):
+    # 一次 stat(.git) 同时回答"仓库在不在 + 是不是 git 仓库"，
+    # 只有 .git 缺失时才补一次对 repo_path 本身的探测。
+    try:
+        git_dir_stat = os.stat(os.path.join(repo_path, ".git"))
+    except OSError:
+        git_dir_stat = None
+
+    if git_dir_stat is not None or os.path.exists(repo_path):
+        if git_dir_stat is not None and stat.S_ISDIR(git_dir_stat.st_mode):
             log_message(f"[Skip] {repo_path} 已存在，跳过下载。", Color.YELLOW)
+            if _remote_head_matches(repo_path):
+                return True
             try:
-                subprocess.run(["git", "-C", repo_path, "fetch", "--all"],
-                               check=True,
-                               stdout=subprocess.DEVNULL,
-                               stderr=subprocess.DEVNULL)
-                subprocess.run(["git", "-C", repo_path, "reset", "--hard", "origin/HEAD"],
-                               check=True,
-                               stdout=subprocess.DEVNULL,
-                               stderr=subprocess.DEVNULL)
+                if shallow:
+                    fetch_cmd = ["git", "-C", repo_path,
+                                 "-c", f"fetch.parallel={git_jobs}",
+                                 "fetch", "--depth=1", "--jobs", str(git_jobs),
+                                 "origin", "HEAD"]
+                    reset_target = "FETCH_HEAD"
+                else:
+                    # 全量模式也只拉 origin HEAD：不取 tags、不枚举备用仓库
+                    # 引用（alternateRefsCommand 置空），避免 fetch --all 把
+                    # 所有远端引用都协商一遍。fetch 后顺带增量更新
+                    # commit-graph，加速后续的历史遍历类操作。
+                    fetch_cmd = ["git", "-C", repo_path,
+                                 "-c", f"fetch.parallel={git_jobs}",
+                                 "-c", "fetch.writeCommitGraph=true",
+                                 "-c", "core.alternateRefsCommand=exit 0 #",
+                                 "fetch", "--no-tags", "--jobs", str(git_jobs),
+                                 "origin", "HEAD"]
+                    reset_target = "FETCH_HEAD"
+                # fetch + reset 合并为一次子进程调用（sh 串联），
+                # 每个仓库少一轮 Python 侧 fork/exec 往返与重试包装
+                reset_cmd = ["git", "-C", repo_path, "reset", "--hard", reset_target]
+                _run_git(["sh", "-c",
+                          shlex.join(fetch_cmd) + " && " + shlex.join(reset_cmd)])
                 return True
-            except subprocess.CalledProcessError:
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
                 log_message(f"[Error] {repo_path} fetch/reset 失败。", Color.RED)
                 return False
         else:
@@ -61,13 +231,21 @@ def safe_git_clone_or_resume(repo_url, repo_path):
             return True
     else:
         try:
-            subprocess.run(
-                ["git", "clone", repo_url, repo_path],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=GIT_CLONE_TIMEOUT,
-            )
+            # clone -c 会把配置写进新仓库：后续 fetch 自动维护 commit-graph，
+            # feature.manyFiles 打开 untracked-cache 等大目录优化
+            clone_cmd = ["git", "clone", "--jobs", str(git_jobs),
+                         "-c", f"fetch.parallel={git_jobs}",
+                         "-c", "fetch.writeCommitGraph=true",
+                         "-c", "feature.manyFiles=1"]
+            if shallow:
+                clone_cmd += ["--depth=1", "--single-branch", "--filter=blob:none"]
+            if GIT_REFERENCE_DIR:
+                # 本地已有同名镜像时直接借对象，省网络传输；
+                # 注意：缓存目录被删除/gc 会破坏借用它的克隆，故仅 opt-in。
+                clone_cmd += ["--reference-if-able",
+                              os.path.join(GIT_REFERENCE_DIR,
+                                           os.path.basename(repo_path))]
+            _run_git(clone_cmd + [repo_url, repo_path], cleanup_path=repo_path)
             log_message(f"[OK] 成功克隆 {repo_url} → {repo_path}", Color.GREEN)
             return True
         except subprocess.TimeoutExpired:
@@ -81,25 +259,96 @@ def safe_git_clone_or_resume(repo_url, repo_path):
             return False
 
 
-def download_repos_from_yaml(yaml_url: str, target_dir: str = TARGET_DIR):
+def _extract_release_repos_stream(yaml_content: str):
+    """
+    以事件流方式扫描 distribution.yaml，只收集
+    repositories.<name>.release.url，不把整棵 YAML 树物化成 dict。
+    大型 distro 文件只需常数级内存。
+    """
+    repos = []
+    # 每层 mapping 一个 [当前键, 是否在等待键] 帧；sequence 层记为 None
+    frames = []
+
+    def value_done():
+        if frames and frames[-1] is not None:
+            frames[-1][0] = None
+            frames[-1][1] = True
+
+    for event in yaml.parse(yaml_content, Loader=_YamlLoader):
+        if isinstance(event, yaml.MappingStartEvent):
+            frames.append([None, True])
+        elif isinstance(event, yaml.SequenceStartEvent):
+            frames.append(None)
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            frames.pop()
+            value_done()
+        elif isinstance(event, yaml.ScalarEvent):
+            top = frames[-1] if frames else None
+            if top is not None and top[1]:
+                top[0] = event.value
+                top[1] = False
+            else:
+                if top is not None:
+                    keys = [f[0] for f in frames if f is not None]
+                    if (len(keys) == 4 and keys[0] == "repositories"
+                            and keys[2] == "release" and keys[3] == "url"):
+                        repos.append((keys[1], event.value))
+                value_done()
+        elif isinstance(event, yaml.AliasEvent):
+            # 别名（*anchor）也占一个键或值的位置：不展开其内容，
+            # 但必须推进键/值状态机，否则该映射后续键值全部错位
+            top = frames[-1] if frames else None
+            if top is not None and top[1]:
+                top[0] = None  # 别名作键：无法匹配目标键链，置空即可
+                top[1] = False
+            else:
+                value_done()
+    return repos
+
+
+def _parse_repos(yaml_content: str, target_dir: str):
+    """
+    从 distribution.yaml 文本提取 (仓库名, release url) 列表。
+    解析结果按内容 sha256 缓存到 target_dir/.yaml_cache/<hash>.json，
+    YAML 未变化时重跑直接读 JSON，跳过整棵 YAML 树的重建。
+    """
+    digest = hashlib.sha256(yaml_content.encode("utf-8")).hexdigest()
+    cache_dir = os.path.join(target_dir, ".yaml_cache")
+    cache_file = os.path.join(cache_dir, f"{digest}.json")
+    try:
+        with open(cache_file) as f:
+            return [tuple(item) for item in json.load(f)]
+    except (OSError, ValueError):
+        pass
+
+    if not _HAS_LIBYAML:
+        log_message("[Info] 未安装 libyaml，使用纯 Python YAML 解析器（较慢）。", Color.YELLOW)
+    repos = _extract_release_repos_stream(yaml_content)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, "w") as f:
+            json.dump(repos, f)
+    except OSError:
+        pass  # 缓存写失败不影响下载流程
+    return repos
+
+
+def download_repos_from_yaml(yaml_url: str, target_dir: str = TARGET_DIR,
+                             jobs: int = DOWNLOAD_JOBS):
     os.makedirs(target_dir, exist_ok=True)
     log_message(f"[Start] 从 {yaml_url} 下载 distribution.yaml", Color.BLUE)
 
     try:
-        response = requests.get(yaml_url)
+        # (连接超时, 读超时)：避免坏网络下无限期挂起
+        response = SESSION.get(yaml_url, timeout=(5, 30))
         response.raise_for_status()
         yaml_content = response.text
     except Exception as e:
         log_message(f"[Error] 下载 YAML 失败: {e}", Color.RED)
         raise
 
-    data = yaml.safe_load(yaml_content)
-
-    repos = []
-    if "repositories" in data:
-        for repo_name, repo_info in data["repositories"].items():
-            if "release" in repo_info and "url" in repo_info["release"]:
-                repos.append((repo_name, repo_info["release"]["url"]))
+    repos = _parse_repos(yaml_content, target_dir)
 
     total = len(repos)
     log_message(f"[Info] Found {total} repositories to download.", Color.BLUE)
@@ -107,25 +356,88 @@ def download_repos_from_yaml(yaml_url: str, target_dir: str = TARGET_DIR):
 
     failed_repos = []
 
-    with tqdm(total=total, desc="Downloading repos", unit="repo") as pbar:
-        for idx, (repo_name, repo_url) in enumerate(repos, start=1):
-            repo_path = os.path.join(target_dir, repo_name)
+    # 状态行先攒在缓冲里，每 64 条合并为一次 tqdm.write；
+    # 进度条也按同一批次一次 update(n)，而不是每仓库重绘一次。
+    # 所有 tqdm 操作都只发生在回收结果的主线程（单消费者），
+    # worker 线程从不碰终端，无需额外的输出队列/锁。
+    status_lines = []
+    pending_ticks = 0
+
+    def flush_status(pbar):
+        nonlocal pending_ticks
+        if status_lines:
+            tqdm.write("\n".join(status_lines))
+            status_lines.clear()
+        if pending_ticks:
+            pbar.update(pending_ticks)
+            pending_ticks = 0
 
-            ok = safe_git_clone_or_resume(repo_url, repo_path)
+    # 断点记录：上次成功且本地 HEAD 未动的仓库整个跳过（零网络开销）
+    progress = _load_progress(target_dir)
+    progress_file = os.path.join(target_dir, ".progress.jsonl")
+
+    # 任务对象在派发前一次性构好：worker 与回收循环只读现成字段，
+    # 热路径上不再反复拼路径/查表
+    tasks = [RepoTask(name, url, os.path.join(target_dir, name))
+             for name, url in repos]
+
+    # 重者先行（LPT）：按上次记录的克隆耗时降序派发，大仓库先占住
+    # worker，避免批次收尾时只剩一个大仓库拖着空闲线程池等。
+    # 没有历史耗时的仓库视为未知大件，排在最前。
+    def _last_seconds(task):
+        rec = progress.get(task.name)
+        seconds = rec.get("seconds") if rec else None
+        return seconds if seconds is not None else float("inf")
+
+    tasks.sort(key=_last_seconds, reverse=True)
+
+    def _download_one(task: RepoTask):
+        rec = progress.get(task.name)
+        if rec and rec.get("sha") and rec["sha"] == _local_head(task.path):
+            return True, None
+        # 纯本地的跳过判断不占名额，只有真要走网络时才限并发
+        with _host_semaphore(task.url):
+            started = time.monotonic()
+            ok = safe_git_clone_or_resume(task.url, task.path)
+            return ok, time.monotonic() - started
+
+    # 并行克隆：每个仓库写入各自独立的目录，互不冲突；
+    # 进度条由 as_completed 驱动，完成一个推进一格。
+    with tqdm(total=total, desc="Downloading repos", unit="repo") as pbar, \
+            ThreadPoolExecutor(max_workers=max(1, jobs)) as pool, \
+            open(progress_file, "a") as progress_f:
+        futures = {pool.submit(_download_one, task): task for task in tasks}
+        for idx, future in enumerate(as_completed(futures), start=1):
+            task = futures[future]
+            try:
+                ok, seconds = future.result()
+            except Exception as e:
+                log_message(f"[Error] {task.name} 下载异常: {e}", Color.RED)
+                ok, seconds = False, None
 
             if ok:
-                tqdm.write(f"[{idx}/{total}] {Color.GREEN}[OK]{Color.RESET} {repo_name}")
+                status_lines.append(f"[{idx}/{total}] {Color.GREEN}[OK]{Color.RESET} {task.name}")
+                # 成功即落一条检查点（主线程串行追加，无需加锁）；
+                # sha 未变（本轮被跳过）的不重复记录
+                sha = _local_head(task.path)
+                rec = progress.get(task.name)
+                if not rec or rec.get("sha") != sha:
+                    entry = {"name": task.name, "sha": sha, "ts": time.time()}
+                    if seconds is not None:
+                        entry["seconds"] = round(seconds, 2)
+                    progress_f.write(json.dumps(entry) + "\n")
             else:
-                tqdm.write(f"[{idx}/{total}] {Color.RED}[Error]{Color.RESET} {repo_name} from {repo_url}")
-                failed_repos.append((repo_name, repo_url))
-
-            pbar.update(1)
+                status_lines.append(f"[{idx}/{total}] {Color.RED}[Error]{Color.RESET} {task.name} from {task.url}")
+                failed_repos.append((task.name, task.url))
+            pending_ticks += 1
+            if len(status_lines) >= 64:
+                flush_status(pbar)
+        flush_status(pbar)
 
     if failed_repos:
         failed_file = os.path.join(target_dir, "failed_repos.txt")
         with open(failed_file, "w") as f:
-            for name, url in failed_repos:
-                f.write(f"{name} {url}\n")
+            f.write("\n".join(f"{name} {url}" for name, url in failed_repos) + "\n")
         log_message(f"[Warning] {len(failed_repos)} failed repos written to {failed_file}", Color.YELLOW)
         print(f"\n{Color.YELLOW}[Warning]{Color.RESET} {len(failed_repos)} repositories failed. See {failed_file}")
 